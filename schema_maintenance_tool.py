@@ -2,6 +2,7 @@ import pyodbc
 import re
 import json
 import os
+import sys
 from pathlib import Path
 from typing import Dict, List, Tuple, Set, Optional
 from dataclasses import dataclass, asdict
@@ -645,6 +646,53 @@ ORDER BY
 
         return suggestions
 
+    def create_search_columns(self, tables: Tuple[str, ...] = ('PMSalesPBI', 'rightScore_results')) -> bool:
+        """Add an indexed, persisted UPPER(ProdGroupDes) column to the tables that have ProdGroupDes.
+
+        The database plugin rewrites UPPER(ProdGroupDes) LIKE '...' filters to
+        use ProdGroupDes_U once it exists. The prompt's category filters,
+        e.g. UPPER(p.ProdGroupDes) LIKE '%COOLANT HOSES%' on PMSalesPBI, then
+        scan the narrow index of stored upper-cased values instead of the
+        whole table with UPPER() evaluated per row; prefix patterns such as
+        'COOLANT%' can seek it. Tables without ProdGroupDes (rightInventory)
+        are skipped. Safe to run repeatedly.
+        """
+        if not self.connection_string:
+            logger.error("No connection string available")
+            return False
+
+        conn = None
+        try:
+            conn = pyodbc.connect(self.connection_string, autocommit=True)
+            cursor = conn.cursor()
+
+            for table in tables:
+                if cursor.execute("SELECT COL_LENGTH(?, 'ProdGroupDes')", table).fetchone()[0] is None:
+                    logger.warning(f"⚠️ {table} has no ProdGroupDes column, skipping")
+                    continue
+
+                # Separate batches: the index can't be compiled until the column exists
+                cursor.execute(f"""
+IF COL_LENGTH('{table}', 'ProdGroupDes_U') IS NULL
+    ALTER TABLE {table} ADD ProdGroupDes_U AS UPPER(ProdGroupDes) PERSISTED;
+""")
+                cursor.execute(f"""
+IF NOT EXISTS (SELECT 1 FROM sys.indexes
+               WHERE name = 'IX_{table}_ProdGroupDes_U' AND object_id = OBJECT_ID('{table}'))
+    CREATE INDEX IX_{table}_ProdGroupDes_U ON {table} (ProdGroupDes_U);
+""")
+                logger.info(f"✅ ProdGroupDes_U search column ready on {table}")
+
+            return True
+
+        except pyodbc.Error as e:
+            logger.error(f"❌ Failed to create search columns: {e}")
+            return False
+
+        finally:
+            if conn is not None:
+                conn.close()
+
 
 def create_env_template():
     """Create a template .env file"""
@@ -706,6 +754,12 @@ def main():
     print("🔧 Initializing schema analyzer...")
     analyzer = SchemaAnalyzer()
 
+    # One-time migration, needs a login with ALTER permission on the tables
+    if '--create-search-columns' in sys.argv:
+        print("🔧 Creating ProdGroupDes_U search columns...")
+        analyzer.create_search_columns()
+        return
+
     # Generate maintenance report
     print("📊 Generating schema maintenance report...")
     report = analyzer.generate_maintenance_report()
@@ -1,8 +1,11 @@
+import atexit
 import json
 import time
 import os
 import sys
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 import uvicorn
 import re
 import socket
@@ -61,10 +64,17 @@ def setup_production_logging():
         # stdout is not available (running from Task Scheduler) - skip console handler
         pass
 
+    # Write-behind: request threads only enqueue records, and a listener
+    # thread does the file/console I/O. Stopping it at exit drains the queue.
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
     # Configure basic logging
     logging.basicConfig(
         level=logging.INFO,
-        handlers=handlers,
+        handlers=[QueueHandler(log_queue)],
         force=True  # Force reconfiguration
     )
 
@@ -601,15 +611,10 @@ async def list_exports():
         if not export_dir.exists():
             return {"exports": [], "message": "No exports directory found"}
         exports = []
-        for file in export_dir.glob("*.csv"):
-            stat = file.stat()
-            exports.append({
-                "filename": file.name,
-                "size_mb": round(stat.st_size / (1024 * 1024), 2),
-                "created": stat.st_ctime,
-                "download_url": f"/download/{file.name}"
-            })
-        for file in export_dir.glob("*.txt"):
+        # One pass over the directory; .gz covers compressed CSV/TXT exports
+        for file in export_dir.iterdir():
+            if file.suffix.lower() not in (".csv", ".txt", ".parquet", ".gz"):
+                continue
             stat = file.stat()
             exports.append({
                 "filename": file.name,
@@ -3,10 +3,13 @@
 import logging
 import pyodbc
 import os
+import threading
+from typing import Iterator, Optional
 from faker import Faker
 from cryptography.fernet import Fernet
 import base64
-from .utils import table_exists, create_table, insert_record
+from .utils import table_exists, create_table, insert_records
+from .service import ConnectionPool, configure_session, estimate_query_rows, FETCH_ARRAYSIZE
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +21,9 @@ class SecureDatabase:
         self.username = username
         self.password = password
         self.conn = None
+        self.pool = None
+        # Showplan mode is per session, so plans are compiled one at a time on self.conn
+        self._plan_lock = threading.Lock()
         self.setup_connection()
 
     def setup_connection(self) -> None:
@@ -33,6 +39,7 @@ class SecureDatabase:
                 "Encrypt=yes;"
                 "TrustServerCertificate=yes;"
                 "Connection Timeout=30;"
+                "MARS_Connection=yes;"
             )
         else:
             # Fallback to trusted connection (for backwards compatibility)
@@ -41,10 +48,14 @@ class SecureDatabase:
                 f"SERVER={self.server_name};"
                 f"DATABASE={self.database_name};"
                 "Trusted_Connection=yes;"
+                "MARS_Connection=yes;"
             )
 
         try:
             self.conn = pyodbc.connect(connection_string)
+            configure_session(self.conn)
+            # Read queries run on pooled connections so concurrent requests don't share one
+            self.pool = ConnectionPool(connection_string)
             logger.info(f"Connected to database {self.database_name} on {self.server_name}")
             if self.username:
                 logger.info(f"Using SQL authentication with user: {self.username}")
@@ -69,37 +80,100 @@ class SecureDatabase:
             fake = Faker()
             logger.debug("Generating and inserting records.")
 
-            for i in range(1000):
-                insert_record(cursor, i, fake)
+            insert_records(cursor, 1000, fake)
 
             self.conn.commit()
             logger.debug("Database setup completed.")
         else:
             logger.info("Skipping database setup - using read-only user")
 
-    def query(self, query: str) -> list:
-        """Execute read-only query"""
-        cursor = self.conn.cursor()
-        try:
-            logger.debug(f"Querying database with: {query}")
+    def query(self, query: str, params: tuple = (), max_rows: int = None) -> list:
+        """Execute read-only query, binding any ? placeholders to params.
+
+        With max_rows, at most that many rows are fetched and the rest of the
+        result set is discarded on the server.
+        """
+        logger.debug(f"Querying database with: {query}")
 
-            # Security check - ensure only SELECT statements
-            query_upper = query.strip().upper()
-            if not query_upper.startswith('SELECT') and not query_upper.startswith('WITH'):
-                if 'INSERT' in query_upper or 'UPDATE' in query_upper or 'DELETE' in query_upper or 'DROP' in query_upper:
-                    logger.warning(f"Rejected non-SELECT query: {query}")
-                    return "Error: Only SELECT queries are allowed"
+        # Security check - ensure only SELECT statements
+        query_upper = query.strip().upper()
+        if not query_upper.startswith('SELECT') and not query_upper.startswith('WITH'):
+            if 'INSERT' in query_upper or 'UPDATE' in query_upper or 'DELETE' in query_upper or 'DROP' in query_upper:
+                logger.warning(f"Rejected non-SELECT query: {query}")
+                return "Error: Only SELECT queries are allowed"
 
-            cursor.execute(query)
-            result = cursor.fetchall()
+        try:
+            with self.pool.acquire() as conn:
+                cursor = self.pool.cursor_for(conn, query)
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                if max_rows is None:
+                    result = cursor.fetchall()
+                else:
+                    result = cursor.fetchmany(max_rows)
+                    # A short batch means the result set is exhausted; only a
+                    # full one can leave rows on the server to discard
+                    if len(result) == max_rows:
+                        cursor.cancel()
             logger.debug(f"Successfully queried database: {len(result) if result else 0} rows returned")
             return result
 
         except Exception as ex:
             logger.error(f"Error querying database: {ex}")
             return f"Database Error: {str(ex)}"
-        finally:
-            cursor.close()
+
+    def iter_query(self, query: str, params: tuple = (), batch_size: int = FETCH_ARRAYSIZE) -> Iterator[list]:
+        """Yield the rows of a read-only query in batches, raising on errors"""
+        query_upper = query.strip().upper()
+        if not query_upper.startswith('SELECT') and not query_upper.startswith('WITH'):
+            if 'INSERT' in query_upper or 'UPDATE' in query_upper or 'DELETE' in query_upper or 'DROP' in query_upper:
+                logger.warning(f"Rejected non-SELECT query: {query}")
+                raise PermissionError("Only SELECT queries are allowed")
+
+        with self.pool.acquire() as conn:
+            cursor = self.pool.cursor_for(conn, query)
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+    def estimate_rows(self, query: str, params: tuple = ()) -> Optional[int]:
+        """Optimizer's row estimate for a read-only query, without running it, or None"""
+        query_upper = query.strip().upper()
+        if not query_upper.startswith(('SELECT', 'WITH')):
+            return None
+        with self._plan_lock:
+            return estimate_query_rows(self.conn, query, params)
+
+    def query_batch(self, query: str, params: tuple = ()) -> list:
+        """Run a batch of SELECT statements in one round trip, returning the rows of each result set"""
+        logger.debug(f"Querying database with batch: {query}")
+
+        statements = [statement.strip().upper() for statement in query.split(';') if statement.strip()]
+        if not all(statement.startswith(('SELECT', 'WITH')) for statement in statements):
+            logger.warning(f"Rejected non-SELECT batch: {query}")
+            return "Error: Only SELECT queries are allowed"
+
+        try:
+            with self.pool.acquire() as conn:
+                cursor = self.pool.cursor_for(conn, query)
+                cursor.execute(query, params)
+                results = [cursor.fetchall()]
+                while cursor.nextset():
+                    results.append(cursor.fetchall())
+            logger.debug(f"Successfully queried database: {len(results)} result sets returned")
+            return results
+
+        except Exception as ex:
+            logger.error(f"Error querying database: {ex}")
+            return f"Database Error: {str(ex)}"
 
     def test_connection(self) -> bool:
         """Test database connection"""
@@ -1,11 +1,24 @@
 import logging
+import queue
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
 import pyodbc
 from faker import Faker
 
-from .utils import table_exists, create_table, insert_record
+from .utils import table_exists, create_table, insert_records
 
 logger = logging.getLogger(__name__)
 
+# Rows requested per driver round trip when fetching results
+FETCH_ARRAYSIZE = 10_000
+
+# Estimated row count of the first statement in an XML showplan
+_PLAN_EST_ROWS_RE = re.compile(r'<StmtSimple\b[^>]*?\bStatementEstRows="([^"]+)"')
+
 # Trusted Connection string for internal CRP SQL Server
 connection_string_template = (
     "DRIVER={ODBC Driver 17 for SQL Server};"
@@ -15,9 +28,176 @@ connection_string_template = (
 )
 
 
+class ConnectionPool:
+    """Bounded pool of open pyodbc connections, checked out per query"""
+
+    def __init__(self, connection_string: str, min_size: int = 1, max_size: int = 5,
+                 checkout_timeout: float = 30, keepalive_interval: float = 300,
+                 statement_cache_size: int = 64) -> None:
+        self.connection_string = connection_string
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self.checkout_timeout = checkout_timeout
+        self.keepalive_interval = keepalive_interval
+        self._idle: "queue.LifoQueue[pyodbc.Connection]" = queue.LifoQueue()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        # Per-connection cursors keyed by the SQL they last executed
+        self._statements: "dict[int, OrderedDict[str, pyodbc.Cursor]]" = {}
+        # Bumped by clear_statements; a connection whose cursors are from an
+        # older generation drops them the next time it is used
+        self._generation = 0
+        self._statement_generations: "dict[int, int]" = {}
+
+        for _ in range(min_size):
+            self._idle.put(self._open())
+
+        # Ping idle connections so firewalls don't silently drop them
+        self._keepalive_thread = threading.Thread(target=self._keepalive, name="db-pool-keepalive", daemon=True)
+        self._keepalive_thread.start()
+
+    def _open(self) -> pyodbc.Connection:
+        with self._lock:
+            if self._size >= self.max_size:
+                raise RuntimeError("Connection pool exhausted")
+            self._size += 1
+        try:
+            # Not autocommit: anything a statement writes stays in an open
+            # transaction, and the rollback on release throws it away
+            conn = pyodbc.connect(self.connection_string, autocommit=False)
+            configure_session(conn)
+            return conn
+        except Exception:
+            with self._lock:
+                self._size -= 1
+            raise
+
+    def _discard(self, conn: pyodbc.Connection) -> None:
+        with self._lock:
+            self._size -= 1
+        self._statements.pop(id(conn), None)
+        self._statement_generations.pop(id(conn), None)
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+
+    def _checkout(self) -> pyodbc.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._size < self.max_size
+        if can_open:
+            try:
+                return self._open()
+            except RuntimeError:
+                pass  # Another caller took the last slot, wait for a release
+
+        try:
+            return self._idle.get(timeout=self.checkout_timeout)
+        except queue.Empty:
+            raise RuntimeError(f"No database connection available after {self.checkout_timeout}s")
+
+    @contextmanager
+    def acquire(self) -> Iterator[pyodbc.Connection]:
+        """Check out a connection and return it to the pool afterwards"""
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def cursor_for(self, conn: pyodbc.Connection, sql: str) -> pyodbc.Cursor:
+        """
+        Return a cursor on conn that last executed sql, creating one if needed.
+
+        pyodbc keeps the prepared statement on the cursor and skips preparing
+        it again when the same SQL text is executed, so reusing the cursor
+        turns repeated queries into plain executes of an existing plan handle.
+        """
+        statements = self._statements.setdefault(id(conn), OrderedDict())
+        if self._statement_generations.get(id(conn), 0) != self._generation:
+            # Only the caller holding conn touches its cursors, so this is safe here
+            self._close_cursors(statements)
+            self._statement_generations[id(conn)] = self._generation
+        cursor = statements.pop(sql, None)
+        if cursor is None:
+            cursor = conn.cursor()
+            cursor.arraysize = FETCH_ARRAYSIZE
+        statements[sql] = cursor
+
+        while len(statements) > self.statement_cache_size:
+            _, evicted = statements.popitem(last=False)
+            try:
+                evicted.close()
+            except pyodbc.Error:
+                pass
+        return cursor
+
+    def clear_statements(self) -> None:
+        """Forget every cached prepared statement, e.g. after a schema change.
+
+        Connections in use finish their current statement first; each one
+        drops its cursors the next time it is checked out.
+        """
+        with self._lock:
+            self._generation += 1
+
+    @staticmethod
+    def _close_cursors(statements: "OrderedDict[str, pyodbc.Cursor]") -> None:
+        for cursor in statements.values():
+            try:
+                cursor.close()
+            except pyodbc.Error:
+                pass
+        statements.clear()
+
+    def _release(self, conn: pyodbc.Connection) -> None:
+        # Undo anything the statement wrote and reset transaction state; a
+        # connection that can't do that is broken
+        try:
+            conn.rollback()
+        except pyodbc.Error:
+            self._discard(conn)
+            return
+        self._idle.put(conn)
+
+    def _keepalive(self) -> None:
+        while not self._closed.wait(self.keepalive_interval):
+            for _ in range(self._idle.qsize()):
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    conn.execute("SELECT 1").fetchone()
+                except pyodbc.Error as ex:
+                    logger.warning("Dropping dead pooled connection: {}.".format(ex))
+                    self._discard(conn)
+                    continue
+                self._idle.put(conn)
+
+    def close(self) -> None:
+        self._closed.set()
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
 class Database:
-    def __init__(self, server_name: str, database_name: str) -> None:
+    def __init__(self, server_name: str, database_name: str, pool_size: int = 5) -> None:
+        self.server_name = server_name
+        self.database_name = database_name
         self.conn = get_connection(server_name=server_name, database_name=database_name)
+        self.pool = ConnectionPool(build_connection_string(server_name, database_name), max_size=pool_size)
+        # Showplan mode is per session, so plans are compiled one at a time on self.conn
+        self._plan_lock = threading.Lock()
 
     def setup(self) -> None:
         logger.debug("Setting up the database.")
@@ -32,33 +212,138 @@ class Database:
         fake = Faker()
         logger.debug("Generating and inserting records.")
 
-        for i in range(1000):
-            insert_record(cursor, i, fake)
+        insert_records(cursor, 1000, fake)
 
         self.conn.commit()
         logger.debug("Database setup completed.")
 
-    def query(self, query: str) -> [pyodbc.Row]:
-        cursor = self.conn.cursor()
+    def query(self, query: str, params: tuple = (), max_rows: int = None) -> [pyodbc.Row]:
         try:
-            logger.debug("Querying database with: {}.".format(query))
-            cursor.execute(query)
-            result = cursor.fetchall()
+            with self.pool.acquire() as conn:
+                cursor = self.pool.cursor_for(conn, query)
+                logger.debug("Querying database with: {}.".format(query))
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                if max_rows is None:
+                    result = cursor.fetchall()
+                else:
+                    result = cursor.fetchmany(max_rows)
+                    # A short batch means the result set is exhausted; only a
+                    # full one can leave rows on the server to discard
+                    if len(result) == max_rows:
+                        cursor.cancel()
             logger.debug("Successfully queried database: {}.".format(result))
         except Exception as ex:
             logger.error("Error querying database: {}.".format(ex))
             return "No Result Found"
-        finally:
-            cursor.close()
 
         return result
 
-def get_connection(server_name: str, database_name: str) -> pyodbc.Connection:
-    connection_string = (
+    def iter_query(self, query: str, params: tuple = (), batch_size: int = FETCH_ARRAYSIZE) -> Iterator[List[pyodbc.Row]]:
+        """
+        Yield the rows of a query in batches of up to batch_size rows.
+
+        The pooled connection stays checked out until the generator is
+        exhausted or closed. Errors are raised rather than returned.
+        """
+        with self.pool.acquire() as conn:
+            cursor = self.pool.cursor_for(conn, query)
+            logger.debug("Streaming query: {}.".format(query))
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+    def estimate_rows(self, query: str, params: tuple = ()) -> Optional[int]:
+        """The optimizer's row estimate for a query, without running it, or None"""
+        with self._plan_lock:
+            return estimate_query_rows(self.conn, query, params)
+
+    def query_batch(self, query: str, params: tuple = ()) -> [[pyodbc.Row]]:
+        """Run a multi-statement batch in one round trip, returning the rows of each result set"""
+        try:
+            with self.pool.acquire() as conn:
+                cursor = self.pool.cursor_for(conn, query)
+                logger.debug("Querying database with batch: {}.".format(query))
+                cursor.execute(query, params)
+                results = [cursor.fetchall()]
+                while cursor.nextset():
+                    results.append(cursor.fetchall())
+            logger.debug("Successfully queried database: {} result sets.".format(len(results)))
+        except Exception as ex:
+            logger.error("Error querying database: {}.".format(ex))
+            return "No Result Found"
+
+        return results
+
+
+def build_connection_string(server_name: str, database_name: str) -> str:
+    return (
         "DRIVER={ODBC Driver 17 for SQL Server};"
         f"SERVER={server_name};"
         f"DATABASE={database_name};"
         "Trusted_Connection=yes;"
+        "MARS_Connection=yes;"
     )
-    return pyodbc.connect(connection_string)
 
+
+def get_connection(server_name: str, database_name: str) -> pyodbc.Connection:
+    conn = pyodbc.connect(build_connection_string(server_name, database_name))
+    configure_session(conn)
+    return conn
+
+
+def configure_session(conn: pyodbc.Connection) -> None:
+    """
+    Apply per-session settings that cut protocol chatter for every statement.
+    """
+    # Suppress the "N rows affected" message sent after each statement
+    conn.execute("SET NOCOUNT ON")
+    # SQL Server's ODBC driver hands nvarchar data over as UTF-16LE; pinning
+    # that codec keeps pyodbc on its direct conversion path instead of a
+    # generic codec lookup, whatever the platform defaults are. varchar
+    # columns are decoded as UTF-8, which covers their ASCII contents here.
+    conn.setdecoding(pyodbc.SQL_WCHAR, encoding='utf-16le')
+    conn.setdecoding(pyodbc.SQL_CHAR, encoding='utf-8')
+    conn.setencoding(encoding='utf-16le')
+
+
+def estimate_query_rows(conn: pyodbc.Connection, query: str, params: tuple = ()) -> Optional[int]:
+    """
+    Compile query under SET SHOWPLAN_XML and return the optimizer's estimate
+    of the rows it returns, or None if there is no usable plan.
+
+    Nothing is executed, so no data is read; the estimate comes from index
+    statistics and can be well off for complex filters. conn must not be
+    shared with concurrent callers while this runs, and must not be a pooled
+    connection: if showplan mode can't be switched off again the connection
+    keeps returning plans instead of rows.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET SHOWPLAN_XML ON")
+        try:
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            plan = cursor.fetchone()
+        finally:
+            cursor.execute("SET SHOWPLAN_XML OFF")
+    except pyodbc.Error as ex:
+        logger.warning("Could not compile a showplan: {}.".format(ex))
+        return None
+    finally:
+        cursor.close()
+
+    match = _PLAN_EST_ROWS_RE.search(plan[0]) if plan and isinstance(plan[0], str) else None
+    if not match:
+        return None
+    return round(float(match.group(1)))
@@ -1,3 +1,5 @@
+import itertools
+
 import pyodbc
 from faker import Faker
 
@@ -43,9 +45,15 @@ CREATE TABLE ExplorationProduction (
     cursor.execute(query)
 
 
-def insert_record(cursor: pyodbc.Cursor, i: int, fake: Faker) -> None:
+INSERT_RECORD_QUERY = '''
+INSERT INTO ExplorationProduction (WellID, WellName, Location, ProductionDate, ProductionVolume, Operator, FieldName, Reservoir, Depth, APIGravity, WaterCut, GasOilRatio) 
+VALUES (?,?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def fake_record(i: int, fake: Faker) -> tuple:
     """
-    Insert a fake record into the ExplorationProduction table.g
+    Build the parameter tuple for one fake ExplorationProduction record.
     """
     well_id = i + 1
     well_name = fake.word() + ' Well'
@@ -60,10 +68,29 @@ def insert_record(cursor: pyodbc.Cursor, i: int, fake: Faker) -> None:
     water_cut = fake.pydecimal(left_digits=2, right_digits=2)
     gas_oil_ratio = fake.pydecimal(left_digits=4, right_digits=2)
 
-    query = '''
-INSERT INTO ExplorationProduction (WellID, WellName, Location, ProductionDate, ProductionVolume, Operator, FieldName, Reservoir, Depth, APIGravity, WaterCut, GasOilRatio) 
-VALUES (?,?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-'''
+    return (well_id, well_name, location, production_date, production_volume, operator,
+            field_name, reservoir, depth, api_gravity, water_cut, gas_oil_ratio)
+
+
+def insert_record(cursor: pyodbc.Cursor, i: int, fake: Faker) -> None:
+    """
+    Insert a fake record into the ExplorationProduction table.
+    """
+    cursor.execute(INSERT_RECORD_QUERY, fake_record(i, fake))
+
+
+def insert_records(cursor: pyodbc.Cursor, count: int, fake: Faker, batch_size: int = 1000) -> None:
+    """
+    Insert count fake records into the ExplorationProduction table in batches.
+
+    fast_executemany sends each batch as one bound parameter array instead of
+    a separate round trip per row.
+    """
+    cursor.fast_executemany = True
+    records = (fake_record(i, fake) for i in range(count))
 
-    # Insert record into the ExplorationProduction table
-    cursor.execute(query, well_id,well_name, location, production_date, production_volume, operator, field_name, reservoir, depth, api_gravity, water_cut, gas_oil_ratio)
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            break
+        cursor.executemany(INSERT_RECORD_QUERY, batch)
@@ -12,7 +12,7 @@ from azure.identity import DefaultAzureCredential
 from azure.core.exceptions import ClientAuthenticationError
 from semantic_kernel import Kernel as SemanticKernel
 from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
-from semantic_kernel.functions import KernelArguments
+from semantic_kernel.functions import KernelArguments, KernelPlugin
 from semantic_kernel.contents.chat_history import ChatHistory
 from semantic_kernel.connectors.ai.function_call_behavior import FunctionCallBehavior
 from semantic_kernel.connectors.ai.open_ai.prompt_execution_settings.azure_chat_prompt_execution_settings import (
@@ -35,6 +35,7 @@ class PluginCacheEntry:
     plugin_instance: Any
     created_at: datetime
     database_version: str  # Track if database schema changes
+    kernel_plugin: Any = None  # Kernel functions built from plugin_instance, reused by every kernel
 
 
 class SessionCache:
@@ -46,7 +47,7 @@ class SessionCache:
         self.prompt_cache: Dict[str, str] = {}
 
     def get_plugin(self, cache_key: str) -> Optional[Any]:
-        """Get cached plugin instance if valid"""
+        """Get cached plugin if valid, as its prebuilt KernelPlugin when there is one"""
         if cache_key not in self.plugin_cache:
             return None
 
@@ -59,14 +60,16 @@ class SessionCache:
             return None
 
         logger.info(f"Using cached plugin for key: {cache_key}")
-        return entry.plugin_instance
+        return entry.kernel_plugin if entry.kernel_plugin is not None else entry.plugin_instance
 
-    def cache_plugin(self, cache_key: str, plugin_instance: Any, database_version: str = "1.0"):
+    def cache_plugin(self, cache_key: str, plugin_instance: Any, database_version: str = "1.0",
+                     kernel_plugin: Any = None):
         """Cache plugin instance with metadata"""
         self.plugin_cache[cache_key] = PluginCacheEntry(
             plugin_instance=plugin_instance,
             created_at=datetime.now(),
-            database_version=database_version
+            database_version=database_version,
+            kernel_plugin=kernel_plugin
         )
         logger.info(f"Cached plugin for key: {cache_key}")
 
@@ -81,6 +84,10 @@ class SessionCache:
 
     def invalidate_all(self):
         """Clear all cached items"""
+        # Kernels built earlier still hold these plugins; drop their query caches too
+        for entry in self.plugin_cache.values():
+            if hasattr(entry.plugin_instance, 'invalidate'):
+                entry.plugin_instance.invalidate()
         self.plugin_cache.clear()
         self.prompt_cache.clear()
         logger.info("All cache entries invalidated")
@@ -178,11 +185,15 @@ class Kernel:
             # Create plugin instance
             plugin_instance = DatabasePlugin(db=self.database_service)
 
+            # Scan the instance for kernel functions once; later kernels that hit
+            # this cache entry reuse the built functions instead of reflecting again
+            kernel_plugin = KernelPlugin.from_object("DatabasePlugin", plugin_instance)
+
             # Cache the plugin instance
-            self.cache.cache_plugin(cache_key, plugin_instance)
+            self.cache.cache_plugin(cache_key, plugin_instance, kernel_plugin=kernel_plugin)
 
             # Add to kernel
-            self.kernel.add_plugin(plugin_instance, "DatabasePlugin")
+            self.kernel.add_plugin(kernel_plugin)
             logger.info("✅ Successfully loaded and cached DatabasePlugin")
 
         except Exception as e:
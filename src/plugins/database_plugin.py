@@ -3,451 +3,1016 @@
 # with clean code structure and proper 360-degree analysis capabilities
 
 import logging
+import asyncio
+import bisect
+import concurrent.futures
+import contextlib
 import csv
+import datetime
+import decimal
+import functools
+import gzip
+import hashlib
+import io
+import itertools
 import os
-from datetime import datetime
-from typing import Annotated, List, Union
+import re
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Annotated, Any, List, Optional, Union
 from pathlib import Path
 
-import pyodbc
 from semantic_kernel.functions.kernel_function_decorator import kernel_function
 
 from src.database.service import Database
 
+# Parquet export is optional; it needs pyarrow, which the server may not have
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+if PARQUET_AVAILABLE:
+    # Arrow column type for each Python type pyodbc reports in cursor.description
+    _ARROW_TYPES = {
+        bool: pa.bool_(),
+        int: pa.int64(),
+        float: pa.float64(),
+        str: pa.string(),
+        bytes: pa.binary(),
+        bytearray: pa.binary(),
+        datetime.datetime: pa.timestamp('us'),
+        datetime.date: pa.date32(),
+        datetime.time: pa.time64('us'),
+        uuid.UUID: pa.string(),
+    }
+    # Values Arrow can't take as they are, converted on the way into their column
+    _ARROW_CONVERTERS = {
+        uuid.UUID: str,
+    }
+
 logger = logging.getLogger(__name__)
 
-# Comprehensive business intelligence prompt with all the detailed guidance
-comprehensive_query_description = """
-Query the CRPAF database using SQL Server syntax. 
-IMPORTANT: Only query these approved production tables:
-
-ACTUAL SALES DATA (INVOICE-BASED):
-- PMSalesPBI: ACTUAL INVOICE SALES DATA by customer (PRIMARY SALES TABLE).
-  Key columns: CaptureDate, Company, CustomerGroup, CustomerName, Product, ProductCategoryID,
-  ProdDivID, ProdGroupID, ProdGroupDes, Quantity, Sales, Cost, Margin, InvMonth, InvQuarter, InvWeek, InvYear, InvDate
-  Use this table when users ask about 'sales to customers', 'how much did we sell', 'revenue', 'margins', 'product categories'
-
-PRODUCT PERFORMANCE & INVENTORY ANALYTICS:
-- rightScore_results: PRODUCT SCORING & INVENTORY OPTIMIZATION DATA (ANALYTICAL TABLE).
-  Key columns: CaptureDate, LastUpdated, Product, ProdGroupDes, Flag3Year, Flag1Year,
-  ForecastScore, VIOScore, CompScore, eBayScore, MSRPScore, DistScore, ProfitScore, StockScore, OverallScore
-  Use for inventory optimization, product performance analysis, dead stock identification
-  SCORING SYSTEM: Higher scores = better performance (5 = excellent, 0 = poor)
-  Flag3Year: 1 = product introduced within last 3 years, 0 = older product
-  Flag1Year: 1 = product introduced within last year, 0 = older than one year
-  StockScore: Focuses on inventory movement and stocking decisions
-  OverallScore: Comprehensive product performance across all metrics
-  Use this table for questions about 'product performance', 'inventory optimization', 'dead stock', 'product scoring'
-
-CURRENT_INVENTORY_DATA:
-- rightInventory: CURRENT INVENTORY LEVELS & COSTS updated monthly (PRIMARY INVENTORY TABLE).
-  Key columns: InventoryDate, Company, Division, Brand, Product, PDescription, Status, Site, StockStatus, Qty, Cost, Value, DSI, ActiveOverstock, ValuewOVS
-  IMPORTANT: Qty is stored as DECIMAL/FLOAT - use Qty <= 5.0 not Qty <= 5 for comparisons
-⚠️ CRITICAL INVENTORY QUERY RULE: 
-ALL rightInventory queries for current inventory MUST include these filters:
-- Status = 'Active' (for active products only)
-- Company = 'CRP' (for CRPAF US-focused results)  
-- Division = 'AUT' (automotive division only, separate from industrial)
-- InventoryDate = (SELECT MAX(InventoryDate) FROM rightInventory WHERE Company = 'CRP' AND Division = 'AUT') (most recent inventory)
-
-NEVER use basic patterns like: SELECT * FROM rightInventory WHERE Product = 'ABC123'
-ALWAYS use complete patterns like: SELECT Product, Qty FROM rightInventory WHERE Product = 'ABC123' AND Status = 'Active' AND Company = 'CRP' AND Division = 'AUT' AND InventoryDate = (SELECT MAX(InventoryDate) FROM rightInventory WHERE Company = 'CRP' AND Division = 'AUT')
-  
-  For category-based inventory queries, you MUST JOIN with pmsalespbi:
-  - Category inventory: SELECT p.ProdGroupDes, SUM(r.Qty) as TotalQty, SUM(r.Value) as TotalValue FROM rightInventory r JOIN pmsalespbi p ON r.Product = p.Product WHERE r.Status = 'Active' AND Division = 'AUT' and Company = 'CRP' AND UPPER(p.ProdGroupDes) LIKE UPPER('%COOLANT HOSES%') GROUP BY p.ProdGroupDes
-  - Low stock by category: SELECT r.Product, r.Qty, p.ProdGroupDes FROM rightInventory r JOIN pmsalespbi p ON r.Product = p.Product WHERE r.Status = 'Active'  AND Division = 'AUT' and Company = 'CRP' AND r.Qty < 5.0 AND UPPER(p.ProdGroupDes) LIKE UPPER('%COOLANT HOSES%')
-  WRONG: SELECT * FROM rightInventory WHERE ProdGroupDes = 'Coolant Hoses' (ProdGroupDes doesn't exist)
-  RIGHT: SELECT r.*, p.ProdGroupDes FROM rightInventory r JOIN pmsalespbi p ON r.Product = p.Product WHERE UPPER(p.ProdGroupDes) LIKE UPPER('%COOLANT HOSES%')  AND Division = 'AUT' and Company = 'CRP'
-  FIELD CLARIFICATION: 
-  - Status = full descriptions ('Active', 'Discontinued', 'In Development', 'Not Renewed', 'Not Usable')
-  - StockStatus = classification codes ('A', 'Q', 'R', etc.) - include both fields in results
-  - Qty = decimal quantity on hand, Cost = unit cost, Value = total inventory value (Qty × Cost)
-  - DSI = Days Sales Inventory (higher = slower moving)
-  - Company = 'CRP' (always use this company for CRPAF queries which keeps the answers US focused)
-    - Division = 'AUT' (always use the 'AUT' division for CRPAF queries which keeps the answers separate from industrial products)
-  For active inventory use: WHERE Status = 'Active' (primary filter)
-  Inventory quantities are updated monthly with fresh data monthly, always use the latest InventoryDate in the response unless the user wants to know inventory history.
-  Use this table for questions about 'current inventory', 'stock levels', 'inventory costs', 'overstock', 'dead stock', 'inventory value'
-
-EBAY MARKET DATA (COMPETITIVE INTELLIGENCE):
-- ebayWT: eBay auction listings (LARGE TABLE - 2M+ records). Market pricing data.
-  Key columns: OEAN, UnitPrice (nvarchar - convert to numeric for calculations), Quantity, CaptureDate, SellerID, Title, EndTime
-  IMPORTANT: UnitPrice is stored as nvarchar(100) - use TRY_CONVERT(decimal(10,2), UnitPrice) for numeric operations
-- ebayWT_NF: eBay auctions for parts and OE's NOT in our inventory that are selling successfully on eBay. Does not include unit price (competitive analysis).
-  This table is used for competitive analysis of parts that we do not currently sell and represent potential market opportunities.
-  Key columns: Title, OEAN, DeltaSold (number that shows only auctions where the eBay quantity sold is increasing over time), ListingURL, SoldDate
-- eBayNF_SupplierMatch: Competitor parts with supplier matching data.
-  Key columns: OEAN, SupplierName, PartDescription (NOTE: Supplier fields may be NULL)
-
-PRICING DATA (OE MSRP & SUPERSESSIONS):
-- OEPriceBookPBI: OE MANUFACTURER PRICING DATA from Standard Motor Products (monthly updates).
-  Key columns: BatchID, Make, [Part Number] (OEAN), [Part Description], [Dealer List Price],
-  [Date Last Price Change], [Supperseded Flag], [Superseded Part Number], [Country ID], Notes, Status
-  Use for MSRP/list price queries, supersession checks, part pricing analysis
-  NOTE: Column names have spaces and brackets - use [Part Number] not Part_Number
-  MSRP queries: SELECT [Part Number], [Dealer List Price] FROM OEPriceBookPBI WHERE [Part Number] = 'PFF5225R'
-  Supersession queries: SELECT [Part Number], [Supperseded Flag], [Superseded Part Number] FROM OEPriceBookPBI WHERE [Part Number] = 'PFF5225R'
-  Price history: SELECT [Part Number], [Dealer List Price], [Date Last Price Change] FROM OEPriceBookPBI WHERE [Part Number] LIKE '%PFF%'
-
-INTERNET COMPETITION DATA (WEB SCRAPED COMPETITORS):
-- InternetCompData: COMPETITOR PRICING & AVAILABILITY from web scraping (competitive intelligence).
-  Key columns: [File_Name], [Record_ID], [OEAN], [Competitor Name], [Description], [Price], [Availability], [Addtl OE Numbers], [Competitor Part Number]
-  Use for competitive pricing analysis, market presence checks, availability comparisons
-  NOTE: Column names have spaces and brackets - use [Competitor Name] not Competitor_Name
-  Competition queries: SELECT [OEAN], [Competitor Name], [Price], [Availability] FROM InternetCompData WHERE [OEAN] = 'PFF5225R'
-  Price comparison: SELECT [OEAN], AVG([Price]) as AvgCompetitorPrice, COUNT(*) as CompetitorCount FROM InternetCompData WHERE [OEAN] = 'PFF5225R' GROUP BY [OEAN]
-  Competitor analysis: SELECT [Competitor Name], COUNT(*) as PartCount, AVG([Price]) as AvgPrice FROM InternetCompData GROUP BY [Competitor Name] ORDER BY PartCount DESC
-
-SUPPLIER SOURCING DATA (INTERNAL SUPPLIER CATALOGS):
-- Suppliers: SUPPLIER SOURCING OPTIONS from MongoDB-processed Excel catalogs (200+ supplier files).
-  Key columns: [OEAN], [Name], [collection]
-  Use for supplier sourcing, availability checks, procurement options
-  collection field: Concatenation of file path + Excel sheet name for supplier traceability
-  Sourcing queries: SELECT [OEAN], [Name], [collection] FROM Suppliers WHERE [OEAN] = 'PFF5225R'
-  Supplier coverage: SELECT [collection], COUNT(*) as PartCount FROM Suppliers GROUP BY [collection] ORDER BY PartCount DESC
-  Multi-source parts: SELECT [OEAN], COUNT(*) as SupplierCount FROM Suppliers GROUP BY [OEAN] HAVING COUNT(*) > 1 ORDER BY SupplierCount DESC
-
-PRODUCT-TO-OEAN MAPPING (ROSETTA STONE):
-- rightStock_ProductOEs: PRODUCT-TO-OEAN CROSS-REFERENCE (enables product-level intelligence).
-  This table shows our products and their OEs. Products listed in this table are OE's that we already claim and could sell.
-  Key columns: [CaptureDate], [Product], [OE]
-  Use to map internal products to OEANs for comprehensive market analysis
-  Product mapping: SELECT [Product], [OE] FROM rightStock_ProductOEs WHERE [Product] = 'HP1000'
-  OEAN lookup: SELECT [Product] FROM rightStock_ProductOEs WHERE [OE] = 'PFF5225R'
-  Product OEAN count: SELECT [Product], COUNT([OE]) as OEANCount FROM rightStock_ProductOEs GROUP BY [Product] ORDER BY OEANCount DESC
-
-INTELLIGENT RESULT HANDLING:
-When queries return large result sets, provide CONTEXTUAL responses instead of generic "large results" messages:
-
-For EXPLORATORY queries ("which products", "show me", "what parts"):
-- Provide a SUMMARY first: "Found 1,247 products with low performance scores across 15 categories"
-- Show MEANINGFUL SAMPLE: "Here are the worst 10 performers:" 
-- Offer SPECIFIC next steps: "Would you like to see: 1) Specific category 2) Worst performers by value 3) Export all results"
-
-For RANKING queries ("best-selling", "highest", "trending"):
-- Always show TOP results: "Here are the top 10 best-selling filters:"
-- Provide CONTEXT: "These represent 45% of total filter sales"
-- Suggest DRILL-DOWN: "Want to see specific customer performance or time trends?"
-
-For PROBLEM IDENTIFICATION ("dead stock", "out of stock", "low performance"):
-- Prioritize by BUSINESS IMPACT: "Found 156 dead stock items worth $2.3M total value"
-- Show ACTIONABLE sample: "Here are the 10 highest-value dead stock items:"
-- Suggest SOLUTIONS: "Consider: 1) Clearance pricing 2) Return to supplier 3) Detailed category analysis"
-
-EXAMPLES OF GOOD RESPONSES:
-Instead of: "Large results. 1) Sample 2) Export"
-Say: "Found 847 products with low performance scores (OverallScore ≤ 2). These represent $1.2M in inventory value across 23 categories. Here are the 10 worst performers by inventory value: [results]. Would you like to focus on a specific category or see recommendations for action?"
-
-Instead of: "Large results. 1) Sample 2) Export" 
-Say: "Your eBay search found 156 transmission filter listings across 27 different brands. Top brands by listing volume: Ford (34 listings), Chevy (28 listings), Toyota (19 listings). Which brand would you like to explore, or shall I show you price trends across all brands?"
-
-360° OEAN INTELLIGENCE QUERIES (COMPREHENSIVE PART ANALYSIS):
-When users ask about a specific OEAN, provide comprehensive intelligence across all tables:
-CRITICAL: Always check rightStock_ProductOEs to find corresponding internal product codes for sales/performance data
-CRITICAL: Use proper table aliases and exact column names with brackets where required
-- Product mapping: SELECT p.[Product] FROM rightStock_ProductOEs p WHERE p.[OE] = '17127531579'
-- MSRP from OEPriceBookPBI: SELECT o.[Part Number], o.[Dealer List Price], o.[Supperseded Flag] FROM OEPriceBookPBI o WHERE o.[Part Number] = '17127531579'
-- Competition from InternetCompData: SELECT i.[Competitor Name], i.[Price], i.[Availability] FROM InternetCompData i WHERE i.[OEAN] = '17127531579'
-- Supplier options from Suppliers: SELECT s.[Name], s.[collection] FROM Suppliers s WHERE s.[OEAN] = '17127531579'
-- eBay activity from ebayWT: SELECT COUNT(*) as ListingCount, AVG(TRY_CONVERT(decimal(10,2), e.UnitPrice)) as AvgEbayPrice FROM ebayWT e WHERE e.OEAN = '17127531579' AND TRY_CONVERT(decimal(10,2), e.UnitPrice) IS NOT NULL
-- Our sales performance: SELECT p.[Product], SUM(s.Sales) as TotalSales, SUM(s.Quantity) as TotalQty FROM rightStock_ProductOEs p JOIN pmsalespbi s ON p.[Product] = s.Product WHERE p.[OE] = '17127531579' GROUP BY p.[Product]
-- Performance scoring: SELECT p.[Product], r.OverallScore, r.StockScore, r.CompScore FROM rightStock_ProductOEs p JOIN rightScore_results r ON p.[Product] = r.Product WHERE p.[OE] = '17127531579'
-
-360° PRODUCT INTELLIGENCE QUERIES (COMPREHENSIVE PRODUCT ANALYSIS):
-When users ask about internal products, use rightStock_ProductOEs to map to OEANs then analyze across all tables:
-CRITICAL: Use proper table aliases and exact column names with brackets where required
-- Product OEAN mapping: SELECT p.[Product], p.[OE] FROM rightStock_ProductOEs p WHERE p.[Product] = 'CHR0406R'
-- MSRP for product OEANs: SELECT p.[Product], p.[OE], o.[Dealer List Price] FROM rightStock_ProductOEs p LEFT JOIN OEPriceBookPBI o ON p.[OE] = o.[Part Number] WHERE p.[Product] = 'CHR0406R'
-- Competition for product OEANs: SELECT p.[Product], p.[OE], i.[Competitor Name], i.[Price] FROM rightStock_ProductOEs p LEFT JOIN InternetCompData i ON p.[OE] = i.[OEAN] WHERE p.[Product] = 'CHR0406R'
-- Suppliers for product OEANs: SELECT p.[Product], p.[OE], s.[Name], s.[collection] FROM rightStock_ProductOEs p LEFT JOIN Suppliers s ON p.[OE] = s.[OEAN] WHERE p.[Product] = 'CHR0406R'
-- eBay activity for product OEANs: SELECT p.[Product], p.[OE], COUNT(e.OEAN) as ListingCount, AVG(TRY_CONVERT(decimal(10,2), e.UnitPrice)) as AvgPrice FROM rightStock_ProductOEs p LEFT JOIN ebayWT e ON p.[OE] = e.OEAN WHERE p.[Product] = 'CHR0406R' GROUP BY p.[Product], p.[OE]
-- Product sales performance: SELECT s.Product, SUM(s.Sales) as TotalSales, SUM(s.Quantity) as TotalQty FROM pmsalespbi s WHERE s.Product = 'CHR0406R' GROUP BY s.Product
-- Product performance scores: SELECT r.Product, r.OverallScore, r.StockScore, r.CompScore FROM rightScore_results r WHERE r.Product = 'CHR0406R'
-
-COMPETITIVE INTELLIGENCE QUERIES:
-- Market coverage: SELECT i.[OEAN], o.[Dealer List Price] as MSRP, AVG(i.[Price]) as AvgCompPrice, COUNT(i.[Competitor Name]) as CompetitorCount FROM InternetCompData i LEFT JOIN OEPriceBookPBI o ON i.[OEAN] = o.[Part Number] GROUP BY i.[OEAN], o.[Dealer List Price]
-- Pricing gaps: SELECT i.[OEAN], o.[Dealer List Price] as MSRP, MIN(i.[Price]) as LowestCompPrice, o.[Dealer List Price] - MIN(i.[Price]) as PricingGap FROM InternetCompData i JOIN OEPriceBookPBI o ON i.[OEAN] = o.[Part Number] GROUP BY i.[OEAN], o.[Dealer List Price] ORDER BY PricingGap DESC
-- Competitor part coverage: SELECT [Competitor Name], COUNT(DISTINCT [OEAN]) as UniquePartsOffered FROM InternetCompData GROUP BY [Competitor Name] ORDER BY UniquePartsOffered DESC
-- High-competition parts: SELECT [OEAN], COUNT([Competitor Name]) as CompetitorCount FROM InternetCompData GROUP BY [OEAN] HAVING COUNT([Competitor Name]) >= 5 ORDER BY CompetitorCount DESC
-
-SOURCING & PROCUREMENT QUERIES:
-- Multi-sourced parts: SELECT [OEAN], COUNT([collection]) as SupplierCount FROM Suppliers GROUP BY [OEAN] HAVING COUNT([collection]) > 1 ORDER BY SupplierCount DESC
-- Supplier catalog coverage: SELECT [collection], COUNT([OEAN]) as PartCount FROM Suppliers GROUP BY [collection] ORDER BY PartCount DESC
-- Parts with both suppliers and competition: SELECT s.[OEAN], COUNT(DISTINCT s.[collection]) as SupplierCount, COUNT(DISTINCT i.[Competitor Name]) as CompetitorCount FROM Suppliers s JOIN InternetCompData i ON s.[OEAN] = i.[OEAN] GROUP BY s.[OEAN] ORDER BY CompetitorCount DESC
-
-
-# Add this section to your comprehensive_query_description:
-
-PRODUCT CATEGORY QUERIES (ProdGroupDes-based searches):
-- Category inventory summary: SELECT ProdGroupDes, COUNT(*) as ProductCount, SUM(Qty) as TotalQty, SUM(Value) as TotalValue FROM rightInventory WHERE Status = 'Active' AND UPPER(ProdGroupDes) LIKE UPPER('%COOLANT HOSES%') GROUP BY ProdGroupDes
-- Products in category: SELECT DISTINCT Product, ProdGroupDes FROM PMSalesPBI WHERE Status = 'Active' AND UPPER(ProdGroupDes) LIKE UPPER('%COOLANT HOSES%') ORDER BY Product
-- Category stock levels: SELECT Product, ProdGroupDes, Qty, FLOOR(Qty) as WholeUnits, CASE WHEN Qty < 1.0 THEN 'OUT' WHEN Qty <= 5.0 THEN 'LOW' ELSE 'OK' END as StockLevel FROM rightInventory WHERE Status = 'Active' AND UPPER(ProdGroupDes) LIKE UPPER('%HPS-PUMPS%')
-- Find product's category: SELECT Product, ProdGroupDes FROM PMSalesPBI WHERE Status = 'Active' AND Product = 'CHR0406R' AND Company = 'CRP' AND Division = 'AUT'
-- All available categories: SELECT DISTINCT ProdGroupDes FROM rightInventory WHERE Status = 'Active' AND ProdGroupDes IS NOT NULL ORDER BY ProdGroupDes
-
-CATEGORY SEARCH BEST PRACTICES:
-- ALWAYS use UPPER() for case-insensitive category matching: UPPER(ProdGroupDes) LIKE UPPER('%COOLANT HOSES%')
-- Use LIKE with % wildcards for partial matches: '%COOLANT%' will match 'Coolant Hoses', 'COOLANT HOSES', 'Coolant-Hoses'
-- For category queries, consider if user wants: summary (COUNT, SUM), product list, or stock analysis
-- Common category patterns: exact match first, then partial match if no results
-- Always include Status = 'Active' filter for current inventory
-- Use GROUP BY ProdGroupDes for category summaries, individual products for detailed listings
-
-CATEGORY QUERY TROUBLESHOOTING:
-- If no results for exact category name, try partial matching with LIKE '%keyword%'
-- Check for variations: 'HPS-Pumps' vs 'HPS Pumps' vs 'HPS_PUMPS'
-- Always verify category exists first: SELECT DISTINCT ProdGroupDes FROM rightInventory WHERE UPPER(ProdGroupDes) LIKE UPPER('%COOLANT%')
-- For large result sets, use TOP N or provide summary statistics instead of full product lists
-
-EXAMPLE CATEGORY WORKFLOWS:
-When user asks "inventory values of Coolant Hoses":
-1. SELECT ProdGroupDes, COUNT(*) as Products, SUM(Value) as TotalValue FROM rightInventory WHERE Status = 'Active' AND UPPER(ProdGroupDes) LIKE UPPER('%COOLANT HOSES%') GROUP BY ProdGroupDes
-2. If no results, try: SELECT DISTINCT ProdGroupDes FROM rightInventory WHERE UPPER(ProdGroupDes) LIKE UPPER('%COOLANT%') ORDER BY ProdGroupDes
-
-When user asks "list of products in coolant hoses":
-1. First check category exists, then: SELECT TOP 50 Product, ProdGroupDes, Qty, Value FROM rightInventory WHERE Status = 'Active' AND UPPER(ProdGroupDes) LIKE UPPER('%COOLANT HOSES%') ORDER BY Value DESC
-
-CRITICAL SEARCH PATTERNS:
-- ALWAYS use LIKE with wildcards for customer AND product searches
-- Customer names often have variations (e.g., 'Autozone', 'Autozone USA', 'AutoZone Inc')
-- Product names/descriptions often have variations (e.g., 'AAE-HPS Racks', 'AAE-HPS Pumps')
-- Use pattern: WHERE CustomerName LIKE '%AUTOZONE%' AND Product LIKE '%AAE-HPS%'
-- For product category analysis: Use ProdGroupDes LIKE '%RACK%' or '%PUMP%'
-- For potential new products to make use eBayWT_NF: Use Title LIKE '%coolant hose%' to find potential matches
-- Case insensitive searches: Use UPPER() function for consistency
-- For OEAN searches across tables: Use exact match first, then LIKE patterns if needed
-
-SEARCH STRATEGY:
-1. For customer searches: WHERE UPPER(CustomerName) LIKE '%[CUSTOMER]%'
-2. For product searches: WHERE UPPER(Product) LIKE '%[PRODUCT]%' OR UPPER(ProdGroupDes) LIKE '%[CATEGORY]%'
-3. For product categories: GROUP BY ProdGroupDes to see category performance
-4. For inventory/performance analysis: Use rightScore_results with appropriate score filters
-5. For MSRP/pricing questions: Use OEPriceBookPBI with [Part Number] searches
-6. For competitive intelligence: Use InternetCompData for competitor pricing
-7. For sourcing options: Use Suppliers for internal procurement possibilities
-8. For comprehensive OEAN analysis: Query multiple tables and present unified intelligence
-9. If no results, suggest checking spelling or trying broader search terms
-
-TABLE USAGE GUIDELINES:
-- For customer sales questions → Use pmsalespbi with CustomerName LIKE
-- For product/category sales → Use pmsalespbi with Product LIKE or ProdGroupDes LIKE
-- For product performance analysis → Use rightScore_results with score filters
-- For inventory optimization → Use rightScore_results focusing on StockScore and OverallScore
-- For dead stock identification → Use rightScore_results WHERE StockScore <= 2 AND Flag3Year = 0
-- For new product tracking → Use rightScore_results WHERE Flag1Year = 1 or Flag3Year = 1
-- For eBay market pricing questions → Use ebayWT and the UnitPrice field
-- For competitive analysis → Use ebayNF_SupplierMatch
-- For MSRP/list price questions → Use OEPriceBookPBI with [Part Number] searches
-- For supersession checks → Use OEPriceBookPBI [Supperseded Flag] and [Superseded Part Number]
-- For competitor pricing → Use InternetCompData with [OEAN] searches
-- For sourcing options → Use Suppliers with [OEAN] searches
-- For comprehensive part intelligence → Query across multiple tables for complete picture
-- For product-to-OEAN mapping → Use rightStock_ProductOEs to connect internal products to market intelligence
-- For multi-OEAN product analysis → Use rightStock_ProductOEs to analyze all OEANs for a single product
-- For current inventory questions → Use rightInventory WHERE Status = 'Active', remember Qty is decimal
-- For low stock alerts -> Use rightInventory WHERE Qty <= 5.0 AND Status = 'Active' 
-- For out of stock -> Use rightInventory WHERE Qty < 1.0 AND Status = 'Active'
-- For inventory optimization -> Join rightInventory with rightScore_results on Product
-- For dead stock identification -> Use rightInventory WHERE DSI > 365 AND Qty >= 1.0 (at least 1 unit)
-- For overstock analysis -> Use rightInventory WHERE ActiveOverstock > 0 OR DSI > 180
-- For inventory valuation -> Use rightInventory Value, Cost columns with SUM aggregations
-- For site inventory comparison -> Use rightInventory GROUP BY Site with SUM(Qty) and SUM(Value)
-- For whole unit calculations -> Use FLOOR(Qty) to get whole units only
-
-CRITICAL OEAN/PRODUCT FIELD MAPPING:
-Each table uses different field names for part identification - USE THE EXACT FIELD NAME FOR EACH TABLE INCLUDING BRACKETS:
-- rightStock_ProductOEs: [OE] (maps internal products to OEANs - MUST USE BRACKETS)
-- OEPriceBookPBI: [Part Number] (OEAN field with brackets)
-- InternetCompData: [OEAN], [Price] (ALL fields need brackets)
-- Suppliers: [OEAN] (OEAN field with brackets)
-- ebayWT: OEAN, UnitPrice (nvarchar - use TRY_CONVERT for calculations)
-- ebayWT_NF: OEAN (field without brackets)
-- ebayNF_SupplierMatch: OEAN (field without brackets)
-- pmsalespbi: Product (internal product code, no brackets)
-- rightScore_results: Product (internal product code, no brackets)
-- rightInventory: Product (internal product code), Site (location), Qty (DECIMAL quantity on hand), 
-  Cost (unit cost), Value (total value), DSI (Days Sales Inventory), Status (Active/Discontinued/In Development/Not Renewed/Not Usable),
-  StockStatus (A/Q/E/R), ActiveOverstock (overstock quantity)
-- QUANTITY COMPARISONS: Always use decimal comparisons (5.0 not 5) and consider FLOOR(Qty) for whole units
-
-CRITICAL JOIN PATTERNS WITH PROPER ALIASES:
-- To get OEANs for a product: SELECT p.[Product], p.[OE] FROM rightStock_ProductOEs p WHERE p.[Product] = 'CHR0406R'
-- To get product for an OEAN: SELECT p.[Product] FROM rightStock_ProductOEs p WHERE p.[OE] = '17127531579'
-- MSRP by OEAN: SELECT o.[Part Number], o.[Dealer List Price] FROM OEPriceBookPBI o WHERE o.[Part Number] = '17127531579'
-- Competition by OEAN: SELECT i.[Competitor Name], i.[Price], i.[Availability] FROM InternetCompData i WHERE i.[OEAN] = '17127531579'
-- Suppliers by OEAN: SELECT s.[Name], s.[collection] FROM Suppliers s WHERE s.[OEAN] = '17127531579'
-- eBay by OEAN: SELECT COUNT(*) as Listings, AVG(TRY_CONVERT(decimal(10,2), e.UnitPrice)) as AvgPrice FROM ebayWT e WHERE e.OEAN = '17127531579' AND TRY_CONVERT(decimal(10,2), e.UnitPrice) IS NOT NULL
-- Sales by product: SELECT s.Product, SUM(s.Sales) as Revenue FROM pmsalespbi s WHERE s.Product = 'CHR0406R'
-- Scoring by product: SELECT r.Product, r.OverallScore FROM rightScore_results r WHERE r.Product = 'CHR0406R'
-
-CRITICAL DATA TYPE HANDLING:
-- ebayWT.UnitPrice is stored as nvarchar(100) - ALWAYS use TRY_CONVERT(decimal(10,2), UnitPrice) for numeric operations
-- Add WHERE TRY_CONVERT(decimal(10,2), UnitPrice) IS NOT NULL to filter out non-numeric values
-- For eBay price queries, always convert text to decimal before AVG, MIN, MAX operations
-- Example: AVG(TRY_CONVERT(decimal(10,2), e.UnitPrice)) instead of AVG(e.UnitPrice)
-
-EXAMPLE COMPREHENSIVE OEAN QUERIES:
-Complete OEAN Intelligence (when user asks about a specific OEAN like '17127531579'):
-1. Product mapping: SELECT [Product] FROM rightStock_ProductOEs WHERE [OE] = '17127531579'
-2. MSRP: SELECT [Part Number], [Dealer List Price], [Supperseded Flag] FROM OEPriceBookPBI WHERE [Part Number] = '17127531579'
-3. Competition: SELECT [Competitor Name], [Price], [Availability] FROM InternetCompData WHERE [OEAN] = '17127531579' ORDER BY [Price]
-4. Suppliers: SELECT [Name], [collection] FROM Suppliers WHERE [OEAN] = '17127531579'
-5. eBay Market: SELECT COUNT(*) as Listings, AVG(TRY_CONVERT(decimal(10,2), e.UnitPrice)) as AvgPrice FROM ebayWT e WHERE e.OEAN = '17127531579' AND TRY_CONVERT(decimal(10,2), e.UnitPrice) IS NOT NULL
-6. Our Performance (via product mapping): SELECT p.[Product], SUM(s.Sales) as Revenue, SUM(s.Quantity) as UnitsSold FROM rightStock_ProductOEs p JOIN pmsalespbi s ON p.[Product] = s.Product WHERE p.[OE] = '17127531579' GROUP BY p.[Product]
-7. Performance Score (via product mapping): SELECT p.[Product], r.OverallScore, r.StockScore FROM rightStock_ProductOEs p JOIN rightScore_results r ON p.[Product] = r.Product WHERE p.[OE] = '17127531579'
-
-EXAMPLE COMPREHENSIVE PRODUCT QUERIES:
-Complete Product Intelligence (when user asks about a product like 'CHR0406R'):
-1. Product OEANs: SELECT [Product], [OE] FROM rightStock_ProductOEs WHERE [Product] = 'CHR0406R'
-2. Sales Performance: SELECT Product, SUM(Sales) as TotalSales, SUM(Quantity) as TotalQty FROM pmsalespbi WHERE Product = 'CHR0406R' GROUP BY Product
-3. Performance Scores: SELECT Product, OverallScore, StockScore, CompScore FROM rightScore_results WHERE Product = 'CHR0406R'
-4. MSRP for all OEANs: SELECT p.[OE], o.[Dealer List Price] FROM rightStock_ProductOEs p JOIN OEPriceBookPBI o ON p.[OE] = o.[Part Number] WHERE p.[Product] = 'CHR0406R'
-5. Competition for all OEANs: SELECT p.[OE], i.[Competitor Name], i.[Price] FROM rightStock_ProductOEs p JOIN InternetCompData i ON p.[OE] = i.[OEAN] WHERE p.[Product] = 'CHR0406R' ORDER BY i.[Price]
-6. Suppliers for all OEANs: SELECT p.[OE], s.[Name] FROM rightStock_ProductOEs p JOIN Suppliers s ON p.[OE] = s.[OEAN] WHERE p.[Product] = 'CHR0406R'
-7. eBay activity for all OEANs: SELECT p.[OE], COUNT(e.OEAN) as Listings FROM rightStock_ProductOEs p LEFT JOIN ebayWT e ON p.[OE] = e.OEAN WHERE p.[Product] = 'CHR0406R' GROUP BY p.[OE]
-
-MARKET INTELLIGENCE QUERIES:
-- Price comparison across sources: SELECT 'MSRP' as Source, o.[Dealer List Price] as Price FROM OEPriceBookPBI o WHERE o.[Part Number] = 'PFF5225R' UNION ALL SELECT 'Competition', AVG(i.[Price]) FROM InternetCompData i WHERE i.[OEAN] = 'PFF5225R' UNION ALL SELECT 'eBay', AVG(TRY_CONVERT(decimal(10,2), e.UnitPrice)) FROM ebayWT e WHERE e.OEAN = 'PFF5225R' AND TRY_CONVERT(decimal(10,2), e.UnitPrice) IS NOT NULL
-- Competition intensity: SELECT [OEAN], COUNT([Competitor Name]) as CompetitorCount, MIN([Price]) as LowestPrice, MAX([Price]) as HighestPrice FROM InternetCompData GROUP BY [OEAN] ORDER BY CompetitorCount DESC
-- Sourcing vs Competition: SELECT s.[OEAN], COUNT(DISTINCT s.[collection]) as SupplierOptions, COUNT(DISTINCT i.[Competitor Name]) as Competitors FROM Suppliers s FULL OUTER JOIN InternetCompData i ON s.[OEAN] = i.[OEAN] GROUP BY s.[OEAN]
-
-INVENTORY ANALYSIS EXAMPLES (DECIMAL-AWARE):
-- Low stock by product: SELECT Product, Site, Qty, FLOOR(Qty) as WholeUnits FROM rightInventory WHERE Qty <= 5.0 AND Status = 'Active' AND Company = 'CRP' AND Division = 'AUT' AND InventoryDate = (SELECT MAX(InventoryDate) FROM rightInventory WHERE Company = 'CRP' AND Division = 'AUT') ORDER BY Qty
-- Out of stock: SELECT Product, Site, Qty, Value FROM rightInventory WHERE Qty < 1.0 AND Status = 'Active' AND Company = 'CRP' AND Division = 'AUT' AND InventoryDate = (SELECT MAX(InventoryDate) FROM rightInventory WHERE Company = 'CRP' AND Division = 'AUT') ORDER BY Value DESC
-- Inventory summary: SELECT COUNT(*) as Products, SUM(Qty) as TotalUnits, SUM(FLOOR(Qty)) as WholeUnits, SUM(Value) as TotalValue FROM rightInventory WHERE Status = 'Active' AND Company = 'CRP' AND Division = 'AUT' AND InventoryDate = (SELECT MAX(InventoryDate) FROM rightInventory WHERE Company = 'CRP' AND Division = 'AUT')
-- Stock by site: SELECT Site, COUNT(*) as Products, SUM(Qty) as TotalUnits, SUM(Value) as TotalValue FROM rightInventory WHERE Status = 'Active' AND Company = 'CRP' AND Division = 'AUT' AND InventoryDate = (SELECT MAX(InventoryDate) FROM rightInventory WHERE Company = 'CRP' AND Division = 'AUT') GROUP BY Site ORDER BY TotalValue DESC
-- Critical stock levels: SELECT Product, Qty, FLOOR(Qty) as WholeUnits, Value, CASE WHEN Qty < 1.0 THEN 'OUT' WHEN Qty <= 2.0 THEN 'CRITICAL' WHEN Qty <= 5.0 THEN 'LOW' ELSE 'OK' END as Status FROM rightInventory WHERE Qty <= 5.0 AND Status = 'Active' AND Company = 'CRP' AND Division = 'AUT' AND InventoryDate = (SELECT MAX(InventoryDate) FROM rightInventory WHERE Company = 'CRP' AND Division = 'AUT')
-
-# ADD to your comprehensive query examples:
-
-DECIMAL QUANTITY BEST PRACTICES:
-- - For "how many X in stock": SELECT Product, Qty, FLOOR(Qty) as WholeUnits FROM rightInventory WHERE Product LIKE '%X%' AND Status = 'Active' AND Company = 'CRP' AND Division = 'AUT' AND InventoryDate = (SELECT MAX(InventoryDate) FROM rightInventory WHERE Company = 'CRP' AND Division = 'AUT')
-- For low stock searches: Always use Qty <= 5.0 (not 5) and consider showing both exact and whole units
-- For inventory totals: Use SUM(Qty) for exact totals, SUM(FLOOR(Qty)) for whole unit totals
-- For stock status: Qty < 1.0 = Out of Stock, Qty <= 5.0 = Low Stock, DSI > 365 = Slow Moving
-
-FORBIDDEN TABLE PATTERNS:
-- Tables ending in '_backup', '_temp', '_staging', '_work'
-- Tables starting with 'temp_', 'backup_', 'old_', 'archive_'
-- Any table containing 'test', 'dev', 'intermediate' in the name
-- Tables not explicitly listed in the approved list above
-
-QUERY BEST PRACTICES:
-- For large result sets (>100 rows), use SELECT TOP N to limit results
-- Use InvDate for sales data timestamps (pmsalespbi)
-- Use CaptureDate/LastUpdated for performance data timestamps (rightScore_results)
-- Use [Date Last Price Change] for pricing data timestamps (OEPriceBookPBI)
-- Use CaptureDate for eBay data timestamps
-- Use proper SQL Server syntax (SELECT TOP N, not LIMIT N)
-- Handle NULL values appropriately
-- ALWAYS use LIKE with % wildcards for name/text searches unless user specifies exact match
-- Use UPPER() function for case-insensitive searches
-- For product searches, try both Product and ProdGroupDes columns
-- When joining tables, use OEAN/Product/[Part Number] as common keys
-- For comprehensive OEAN analysis, suggest follow-up queries across related tables
-
-When users ask about a specific OEAN or part number, ALWAYS first check rightStock_ProductOEs to find corresponding internal product codes, then provide comprehensive intelligence by querying multiple relevant tables including the mapped product data to give a complete market picture including MSRP, competition, sourcing options, eBay activity, our sales performance (via product mapping), and scoring data (via product mapping).
-When users ask about sales, revenue, customers, or 'how much did we sell', use pmsalespbi as the primary source with LIKE pattern matching.
-When users ask about product performance, inventory optimization, dead stock, or product scoring, use rightScore_results.
-When users ask about MSRP, list price, dealer price, supersessions, or manufacturer pricing, use OEPriceBookPBI.
-When users ask about competitor pricing, market presence, or 'who else sells this', use InternetCompData.
-When users ask about supplier options, sourcing, or 'where can we get this', use Suppliers.
-When users ask about market pricing or eBay activity, use the eBay tables.
-For any specific OEAN inquiry, automatically suggest related queries across all relevant tables to provide complete market intelligence.
-"""
+# Comprehensive business intelligence prompt with all the detailed guidance.
+# Kept in prompts/ next to this module and read once per process.
+PROMPT_PATH = Path(__file__).with_name("prompts") / "database_plugin_prompt.md"
+
+
+@functools.cache
+def load_query_description() -> str:
+    """Load the query function description from its prompt file.
+
+    Trailing spaces and runs of blank lines carry nothing for the model but
+    are sent with every tool schema, so they are dropped at load.
+    """
+    text = PROMPT_PATH.read_text(encoding="utf-8")
+    text = re.sub(r"[ \t]+$", "", text, flags=re.MULTILINE)
+    return re.sub(r"\n{3,}", "\n\n", text).strip() + "\n"
+
+
+comprehensive_query_description = load_query_description()
+
+# "- <intent>: SELECT ..." example lines in the prompt
+_PROMPT_EXAMPLE_RE = re.compile(r"^[ \t]*-[ \t]+(\w[^:\n]*?):[ \t]*(SELECT\b.*?)[ \t]*$", re.MULTILINE)
+
+
+def parse_intent_sql(prompt: str) -> "dict[str, str]":
+    """Map each example intent in the prompt (lower-cased) to its SQL template"""
+    return {intent.strip().lower(): sql for intent, sql in _PROMPT_EXAMPLE_RE.findall(prompt)}
+
+
+_INTENT_SQL = parse_intent_sql(comprehensive_query_description)
+
+
+# Leading "SELECT <list> FROM" of a single-SELECT query, used to rewrite the
+# projection into COUNT_BIG(*) instead of wrapping the whole query in a subquery.
+# The first FROM may sit inside a string literal, so lists with one are not rewritten
+_SELECT_LIST_RE = re.compile(r'^\s*SELECT\s+.*?\bFROM\b', re.IGNORECASE | re.DOTALL)
+# String literals and whitespace runs, for canonicalizing SQL
+_SQL_LITERAL_SPLIT_RE = re.compile(r"('(?:[^']|'')*')")
+_WHITESPACE_RE = re.compile(r"\s+")
+# Whitespace around punctuation/operators carries no meaning
+_SQL_PUNCT_SPACE_RE = re.compile(r" ?([,()=<>+*/]) ?")
+# Queries whose results depend on the clock or the monthly refresh are never cached
+_VOLATILE_SQL_RE = re.compile(
+    r'\b(GETDATE|GETUTCDATE|SYSDATETIME|CURRENT_TIMESTAMP|NEWID|RAND)\b|MAX\s*\(\s*InventoryDate\s*\)',
+    re.IGNORECASE
+)
+# Head of a SELECT, optionally with DISTINCT/ALL, where a TOP clause belongs
+_SELECT_HEAD_RE = re.compile(r'^\s*SELECT\s+(?:(?:DISTINCT|ALL)\s+)?', re.IGNORECASE)
+_SELECT_DISTINCT_RE = re.compile(r'^\s*SELECT\s+DISTINCT\b', re.IGNORECASE)
+_TOP_CLAUSE_RE = re.compile(r'^\s*SELECT\s+(?:(?:DISTINCT|ALL)\s+)?TOP\b', re.IGNORECASE)
+# A literal TOP N row cap; PERCENT and WITH TIES don't bound the row count by N
+_TOP_N_RE = re.compile(
+    r'^\s*SELECT\s+(?:(?:DISTINCT|ALL)\s+)?TOP\s*\(?\s*(\d+)\s*\)?\s*(PERCENT\b|WITH\s+TIES\b)?',
+    re.IGNORECASE
+)
+_SET_OPERATOR_RE = re.compile(r'\b(UNION|INTERSECT|EXCEPT)\b', re.IGNORECASE)
+# OFFSET ... FETCH paging, which SQL Server won't combine with TOP
+_OFFSET_RE = re.compile(r'\bOFFSET\b', re.IGNORECASE)
+# Constructs whose row count changes if the projection is replaced
+_COUNT_REWRITE_BLOCKERS_RE = re.compile(r'\b(DISTINCT|GROUP\s+BY|HAVING|UNION|INTERSECT|EXCEPT|TOP|OFFSET)\b',
+                                        re.IGNORECASE)
+# Aggregates in a select list collapse the result to one row
+_AGGREGATE_CALL_RE = re.compile(r'\b(COUNT|COUNT_BIG|SUM|AVG|MIN|MAX|STDEV|VAR|STRING_AGG)\s*\(', re.IGNORECASE)
+# UPPER() applied to a string literal, e.g. the UPPER('%COOLANT HOSES%') side
+# of the LIKE filters the prompt asks for
+_UPPER_LITERAL_RE = re.compile(r"\bUPPER\s*\(\s*(N?'(?:[^']|'')*')\s*\)", re.IGNORECASE)
+# UPPER(ProdGroupDes) LIKE '<literal>', optionally alias-qualified
+_PRODGROUP_LIKE_RE = re.compile(
+    r"\bUPPER\s*\(\s*(\w+\.)?\[?ProdGroupDes\]?\s*\)\s+LIKE\s+('(?:[^']|'')*')",
+    re.IGNORECASE
+)
+# The latest-inventory subquery every rightInventory query is told to carry
+_LATEST_INVENTORY_DATE_RE = re.compile(
+    r"\(\s*SELECT\s+MAX\s*\(\s*InventoryDate\s*\)\s+FROM\s+rightInventory\s+"
+    r"WHERE\s+Company\s*=\s*'CRP'\s+AND\s+Division\s*=\s*'AUT'\s*\)",
+    re.IGNORECASE
+)
+
+
+# Latest InventoryDate for the CRP automotive division, bound into queries
+# in place of the MAX(InventoryDate) subquery the prompt asks for
+CRP_AUT_FILTER = "Company = 'CRP' AND Division = 'AUT'"
+LATEST_INVENTORY_DATE_QUERY = f"SELECT MAX(InventoryDate) FROM rightInventory WHERE {CRP_AUT_FILTER}"
+
+# Customer and product name suggestions in one round trip, tagged C / P.
+# Fixed SQL text with the search term bound once, so the pooled connections
+# reuse one prepared cursor and the server one plan across search terms.
+_SIMILAR_MATCHES_QUERY = (
+    "WITH term AS (SELECT '%' + UPPER(?) + '%' AS pattern) "
+    "SELECT 'C' AS kind, name FROM ("
+    "SELECT DISTINCT TOP 10 CustomerName AS name FROM pmsalespbi "
+    "WHERE UPPER(CustomerName) LIKE (SELECT pattern FROM term) ORDER BY CustomerName) AS customers "
+    "UNION ALL "
+    "SELECT 'P', name FROM ("
+    "SELECT DISTINCT TOP 10 Product AS name FROM pmsalespbi "
+    "WHERE UPPER(Product) LIKE (SELECT pattern FROM term) ORDER BY Product) AS products "
+    "ORDER BY kind, name"
+)
+
+# The 360-degree OEAN lookups from the prompt, run as one batch; each binds the OEAN once
+OEAN_360_QUERIES = (
+    ("Product mapping", "SELECT [Product] FROM rightStock_ProductOEs WHERE [OE] = ?"),
+    ("MSRP", "SELECT [Part Number], [Dealer List Price], [Supperseded Flag] FROM OEPriceBookPBI "
+             "WHERE [Part Number] = ?"),
+    ("Competition", "SELECT [Competitor Name], [Price], [Availability] FROM InternetCompData "
+                    "WHERE [OEAN] = ? ORDER BY [Price]"),
+    ("Suppliers", "SELECT [Name], [collection] FROM Suppliers WHERE [OEAN] = ?"),
+    ("eBay market", "SELECT COUNT(*) as Listings, AVG(TRY_CONVERT(decimal(10,2), e.UnitPrice)) as AvgPrice "
+                    "FROM ebayWT e WHERE e.OEAN = ? AND TRY_CONVERT(decimal(10,2), e.UnitPrice) IS NOT NULL"),
+    ("Our performance", "SELECT p.[Product], SUM(s.Sales) as Revenue, SUM(s.Quantity) as UnitsSold "
+                        "FROM rightStock_ProductOEs p JOIN pmsalespbi s ON p.[Product] = s.Product "
+                        "WHERE p.[OE] = ? GROUP BY p.[Product]"),
+    ("Performance score", "SELECT p.[Product], r.OverallScore, r.StockScore "
+                          "FROM rightStock_ProductOEs p JOIN rightScore_results r ON p.[Product] = r.Product "
+                          "WHERE p.[OE] = ?"),
+)
+_OEAN_360_BATCH = ";\n".join(sql for _, sql in OEAN_360_QUERIES)
+
+# Persisted UPPER(ProdGroupDes) column created by schema_maintenance_tool.py
+SEARCH_COLUMN = "ProdGroupDes_U"
+# Tables with a ProdGroupDes column, and whether each also has the search column
+_SEARCH_COLUMN_TABLES_QUERY = (
+    "SELECT OBJECT_NAME(c.object_id), CASE WHEN cc.object_id IS NULL THEN 0 ELSE 1 END "
+    "FROM sys.columns c LEFT JOIN sys.computed_columns cc "
+    "ON cc.object_id = c.object_id AND cc.name = ? AND cc.is_persisted = 1 "
+    "WHERE c.name = 'ProdGroupDes'"
+)
+
+# Row count from catalog metadata; O(1) regardless of table size. The DMV
+# needs VIEW DATABASE STATE, sys.partitions only metadata visibility.
+_FAST_COUNT_QUERY = (
+    "SELECT SUM(row_count) FROM sys.dm_db_partition_stats "
+    "WHERE object_id = OBJECT_ID(?) AND index_id IN (0, 1)"
+)
+_CATALOG_COUNT_QUERY = (
+    "SELECT SUM(rows) FROM sys.partitions "
+    "WHERE object_id = OBJECT_ID(?) AND index_id IN (0, 1)"
+)
+
+# String literals and comments, blanked out before looking for table names
+_SQL_LITERAL_OR_COMMENT_RE = re.compile(r"N?'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/", re.DOTALL)
+# A table reference: optionally bracketed, optionally schema/database-qualified
+_TABLE_NAME = (r'(?:\[[^\]]+\]|"[^"]+"|[A-Za-z_#@]\w*)'
+               r'(?:\s*\.\s*(?:\[[^\]]+\]|"[^"]+"|[A-Za-z_]\w*))*')
+# Rowset functions read remote tables named inside a string literal
+_ROWSET_FUNCTION_RE = re.compile(r'\bOPEN(?:QUERY|ROWSET|DATASOURCE)\s*\(', re.IGNORECASE)
+# Table after FROM or JOIN; the rest of a FROM clause may list more after commas
+_TABLE_REF_RE = re.compile(rf"\b(?:FROM|JOIN)\s+({_TABLE_NAME})", re.IGNORECASE)
+_FROM_CLAUSE_END_RE = re.compile(
+    r"\b(?:WHERE|GROUP|ORDER|HAVING|OPTION|UNION|EXCEPT|INTERSECT|JOIN|SELECT)\b|[();]",
+    re.IGNORECASE
+)
+_COMMA_TABLE_RE = re.compile(rf",\s*({_TABLE_NAME})")
+
+# Non-production table name patterns, matched against table names only
+FORBIDDEN_TABLE_PATTERNS = frozenset({
+    '_BACKUP', '_TEMP', '_STAGING', '_WORK', 'TEMP_', 'BACKUP_', 'OLD_', 'ARCHIVE_',
+    'TEST', 'DEV', 'INTERMEDIATE',
+})
+# Longest alternatives first, so where two patterns match at the same position
+# the more specific one is reported; sorted so the pattern is the same every run
+_FORBIDDEN_RE = re.compile(
+    '|'.join(map(re.escape, sorted(FORBIDDEN_TABLE_PATTERNS, key=lambda pattern: (-len(pattern), pattern)))),
+    re.IGNORECASE
+)
+
+
+# get_table_size labels: a count above TABLE_SIZE_THRESHOLDS[i] gets TABLE_SIZE_LABELS[i + 1]
+TABLE_SIZE_THRESHOLDS = (10_000, 100_000, 1_000_000)
+TABLE_SIZE_LABELS = (
+    "SMALL - Fast for any query",
+    "MEDIUM - Good for most queries",
+    "LARGE - Consider using TOP N for faster queries",
+    "VERY LARGE - Use specific WHERE conditions or TOP N",
+)
+
+
+@functools.lru_cache(maxsize=512)
+def _table_references(query: str) -> "tuple[str, ...]":
+    """Tables a query reads from, as written, in order of appearance.
+
+    String literals and comments are skipped, so a LIKE '%TEST%' filter or a
+    commented-out FROM doesn't count. Derived tables contribute the tables
+    of their inner FROM clauses.
+    """
+    scrubbed = _SQL_LITERAL_OR_COMMENT_RE.sub(' ', query)
+    tables = []
+    for match in _TABLE_REF_RE.finditer(scrubbed):
+        tables.append(match.group(1))
+        if match.group(0)[:4].upper() == 'FROM':
+            # Old-style comma joins list more tables before the next clause;
+            # pos/endpos scan in place rather than slicing off the tail
+            end = _FROM_CLAUSE_END_RE.search(scrubbed, match.end())
+            tables.extend(_COMMA_TABLE_RE.findall(scrubbed, match.end(), end.start() if end else len(scrubbed)))
+    return tuple(tables)
+
+
+def _bare_table_name(table: str) -> str:
+    """Unqualified, unbracketed, unquoted name of a table reference"""
+    return table.rsplit('.', 1)[-1].strip().strip('[]"')
+
+
+def _table_cache_key(table: str) -> str:
+    """Case-, bracket- and dbo-insensitive key for a table reference.
+
+    ebayWT, [ebayWT], "ebayWT" and dbo.ebayWT name the same table and share
+    a cache entry.
+    """
+    parts = [part.strip().strip('[]"').lower() for part in table.strip().split('.')]
+    if len(parts) == 2 and parts[0] == 'dbo':
+        parts = parts[1:]
+    return '.'.join(parts)
+
+
+# "- <table>: <description>" entries of the prompt's table catalogue
+_PROMPT_TABLE_RE = re.compile(r"^-[ \t]+(\w+):", re.MULTILINE)
+
+
+def parse_approved_tables(prompt: str) -> "dict[str, str]":
+    """Map each table in the prompt's catalogue, keyed like the table caches, to its name as written.
+
+    The catalogue is the list of tables ahead of the first guidance section,
+    so the prompt stays the one place the approved tables are named.
+    """
+    catalogue = prompt.split("INTELLIGENT RESULT HANDLING:", 1)[0]
+    return {_table_cache_key(name): name for name in _PROMPT_TABLE_RE.findall(catalogue)}
+
+
+APPROVED_TABLES = parse_approved_tables(comprehensive_query_description)
+
+
+def _outer_order_by_pos(query_upper: str) -> int:
+    """Position of the outer query's ORDER BY in upper-cased SQL, or -1.
+
+    An ORDER BY followed by an unmatched ')' belongs to a subquery.
+    """
+    order_by_pos = query_upper.rfind('ORDER BY')
+    if order_by_pos < 0:
+        return -1
+    tail = query_upper[order_by_pos:]
+    return -1 if tail.count(')') > tail.count('(') else order_by_pos
+
+
+# Tokens that matter when looking for the SELECT that follows a CTE list
+_CTE_SCAN_RE = re.compile(r"'(?:[^']|'')*'|[()]|\bSELECT\b")
+
+
+def _strip_sql_comments(query: str) -> str:
+    """Query with -- and /* */ comments blanked out, string literals untouched"""
+    if '--' not in query and '/*' not in query:
+        return query
+    return _SQL_LITERAL_OR_COMMENT_RE.sub(
+        lambda m: m.group(0) if m.group(0)[-1:] == "'" else ' ', query)
+
+
+def _split_cte(query: str, query_upper: str) -> "tuple[str, str]":
+    """Split a WITH query into its CTE list and the SELECT that follows it.
+
+    Returns ('', query) for a query without CTEs. T-SQL doesn't allow a WITH
+    inside a derived table, so wrappers must go around the final SELECT only.
+    """
+    if not query_upper.startswith('WITH'):
+        return '', query
+    depth = 0
+    for token in _CTE_SCAN_RE.finditer(query_upper):
+        text = token.group(0)
+        if text == '(':
+            depth += 1
+        elif text == ')':
+            depth -= 1
+        elif text == 'SELECT' and depth == 0:
+            return query[:token.start()], query[token.start():]
+    return '', query
+
+
+# Limits for results returned in full: generous, they only guard against runaway rows
+FULL_RESULT_MAX_COLS = 64
+FULL_RESULT_MAX_CELL_CHARS = 1000
+FULL_RESULT_MAX_CHARS = 256 * 1024
+
+# Write buffer for export files
+EXPORT_BUFFER_SIZE = 1 << 20
+# Exports taking longer than this carry on in the background as a job
+EXPORT_WAIT_SECONDS = 10
+# A finished export job can be collected for this long before it is dropped
+EXPORT_JOB_TTL_SECONDS = 24 * 60 * 60
+# Long exports outlive the kernel call that started them, and the plugin too:
+# /admin/clear_cache and token refreshes rebuild it while jobs are running
+_export_pool = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="db-export")
+
+
+class TTLCache:
+    """Small thread-safe cache with per-entry expiry and LRU eviction"""
+
+    def __init__(self, maxsize: int = 64, ttl: float = 60) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Any, value: Any) -> None:
+        """Store a value, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Export job id -> Future, shared by every plugin instance
+_export_jobs = TTLCache(maxsize=256, ttl=EXPORT_JOB_TTL_SECONDS)
 
 
 class DatabasePlugin:
     """DatabasePlugin with smart result handling for large datasets."""
 
-    def __init__(self, db: Database, max_display_rows: int = 100, export_dir: str = "C:/Logs/VoiceSQL/exports") -> None:
+    # Export directories already created by this process
+    _ready_export_dirs: "set[Path]" = set()
+    # Numbers this process's export files; next() on a count is atomic
+    _export_sequence = itertools.count(1)
+
+    def __init__(self, db: Database, max_display_rows: int = 100, export_dir: str = "C:/Logs/VoiceSQL/exports",
+                 count_cache_ttl: float = 300, compress_exports: bool = False,
+                 bcp_export_threshold: Optional[int] = None, result_cache_ttl: float = 600) -> None:
         self.db = db
         self.max_display_rows = max_display_rows
+        self.compress_exports = compress_exports
+        # TXT exports estimated above this many rows go through the bcp utility
+        # instead of being fetched over ODBC (None disables the bcp path)
+        self.bcp_export_threshold = bcp_export_threshold
         self.export_dir = Path(export_dir)
-        self.export_dir.mkdir(parents=True, exist_ok=True)
+        self._ensure_export_dir(self.export_dir)
+
+        # Table row counts barely move within a conversation, so repeated
+        # size checks against large tables (ebayWT) pay for one COUNT(*) only
+        self._count_cache = TTLCache(maxsize=64, ttl=count_cache_ttl)
+        # COUNT results for oversized queries, keyed like the result cache
+        self._estimate_cache = TTLCache(maxsize=256, ttl=count_cache_ttl)
+        # Agents often re-issue byte-identical SQL across turns
+        self._result_cache = TTLCache(maxsize=1024, ttl=result_cache_ttl)
+        # Latest InventoryDate, keyed by calendar day; inventory refreshes monthly
+        self._inventory_date_cache = TTLCache(maxsize=1, ttl=24 * 60 * 60)
+        # Metadata row-count queries still worth trying, in order
+        self._count_queries = (_FAST_COUNT_QUERY, _CATALOG_COUNT_QUERY)
+        # Tables with ProdGroupDes -> whether they have the ProdGroupDes_U
+        # search column, looked up on first use
+        self._search_columns: "Optional[dict[str, bool]]" = None
+
+    def invalidate(self) -> None:
+        """Drop every cached count, estimate and result, e.g. after DDL or a data load"""
+        self._count_cache.clear()
+        self._estimate_cache.clear()
+        self._result_cache.clear()
+        self._inventory_date_cache.clear()
+        self._search_columns = None
+        # Cached prepared statements may have been compiled against the old schema
+        pool = getattr(self.db, 'pool', None)
+        if pool is not None:
+            pool.clear_statements()
+        logger.info("DatabasePlugin caches invalidated")
+
+    @classmethod
+    def _ensure_export_dir(cls, export_dir: Path) -> None:
+        """Create export_dir once per process rather than on every instance"""
+        if export_dir not in cls._ready_export_dirs:
+            export_dir.mkdir(parents=True, exist_ok=True)
+            cls._ready_export_dirs.add(export_dir)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _canonical_sql(query: str) -> str:
+        """Canonical form of a query, so cosmetic variants of the same SQL compare equal.
+
+        Comments are removed first: a -- comment ends at a line break, so
+        collapsing whitespace inside one could move code into or out of it.
+        Outside string literals, keywords and identifiers are upper-cased,
+        whitespace is collapsed and dropped around punctuation, and a trailing
+        semicolon is removed. Literals are kept verbatim.
+        """
+        # split() with a capturing group alternates code and literals, so the
+        # loop runs once per literal rather than once per token
+        parts = _SQL_LITERAL_SPLIT_RE.split(_strip_sql_comments(query))
+        for i in range(0, len(parts), 2):
+            parts[i] = _WHITESPACE_RE.sub(' ', parts[i]).upper()
+        canonical = _SQL_PUNCT_SPACE_RE.sub(r'\1', ''.join(parts).strip())
+        return canonical.rstrip(';').rstrip()
+
+    @classmethod
+    def _result_cache_key(cls, query: str, params: tuple = ()) -> str:
+        """SHA-256 of the canonical SQL plus bound parameters"""
+        canonical = cls._canonical_sql(query)
+        return hashlib.sha256(f"{canonical}\x00{params!r}".encode('utf-8')).hexdigest()
+
+    def _cached_query(self, query: str, params: tuple = (), max_rows: Optional[int] = None) -> Union[list, str]:
+        """Run a query through the exact-match result cache"""
+        if _VOLATILE_SQL_RE.search(query):
+            return self.db.query(query, params, max_rows=max_rows)
+
+        cache_key = self._result_cache_key(query, params + (max_rows,))
+        result = self._result_cache.get(cache_key)
+        if result is not None:
+            logger.info("Serving query result from cache")
+            return result
+
+        result = self.db.query(query, params, max_rows=max_rows)
+        if isinstance(result, list):
+            self._result_cache.set(cache_key, result)
+        return result
+
+    @staticmethod
+    def _check_forbidden(query: str) -> Optional[str]:
+        """Rejection message if the query reads a non-production table, else None.
+
+        Only table names are checked, so literals and column names such as
+        MODEL_TEST_ID don't trip the patterns.
+        """
+        # One C-level scan clears the common case; only a hit somewhere in the
+        # text pays for pulling out the table names
+        forbidden_match = _FORBIDDEN_RE.search(query)
+        if not forbidden_match:
+            return None
+        tables = _table_references(query)
+        # Fail closed when the names can't be trusted: nothing parsed, or a
+        # rowset function whose table names are hidden in a string
+        if tables and not _ROWSET_FUNCTION_RE.search(query):
+            for table in tables:
+                forbidden_match = _FORBIDDEN_RE.search(table)
+                if forbidden_match:
+                    break
+            else:
+                return None
+        pattern = forbidden_match.group(0).upper()
+        error_msg = f"Query rejected: Contains forbidden table pattern '{pattern}'. Only approved production tables are allowed."
+        logger.warning(error_msg)
+        return error_msg
+
+    def _postprocess_sql(self, query: str) -> str:
+        """Rewrite generated SQL into an equivalent, cheaper form before it runs.
+
+        UPPER('%kw%') on a literal is folded to '%KW%' so the pattern is a
+        constant the server doesn't evaluate per row, and so LIKE filters
+        written either way share one result cache entry. Only ASCII literals
+        are folded, where Python and SQL Server agree on upper-casing.
+
+        UPPER(ProdGroupDes) LIKE '%KW%' is then pointed at the persisted,
+        indexed ProdGroupDes_U column when every table in the query that has a
+        ProdGroupDes column also has ProdGroupDes_U. Other joined tables, such
+        as rightInventory in the category inventory query, don't matter: the
+        column can only belong to a table that has it.
+        """
+        def fold(match: re.Match) -> str:
+            literal = match.group(1)
+            return literal.upper() if literal.isascii() else match.group(0)
+
+        query = _UPPER_LITERAL_RE.sub(fold, query)
+
+        if _PRODGROUP_LIKE_RE.search(query):
+            search_columns = self._search_column_tables()
+            tables = {_bare_table_name(table).lower() for table in _table_references(query)} & search_columns.keys()
+            if tables and all(search_columns[table] for table in tables):
+                query = _PRODGROUP_LIKE_RE.sub(
+                    lambda m: f"{m.group(1) or ''}{SEARCH_COLUMN} LIKE {m.group(2)}"
+                    if m.group(2) == m.group(2).upper() else m.group(0),
+                    query)
+        return query
+
+    def _search_column_tables(self) -> "dict[str, bool]":
+        """Lower-cased names of tables with ProdGroupDes -> whether they have ProdGroupDes_U"""
+        if self._search_columns is None:
+            result = self.db.query(_SEARCH_COLUMN_TABLES_QUERY, (SEARCH_COLUMN,))
+            if isinstance(result, str):
+                return {}  # Try again next time
+            self._search_columns = {row[0].lower(): bool(row[1]) for row in result or []}
+        return self._search_columns
+
+    def _current_inventory_date(self) -> Optional[Any]:
+        """Latest rightInventory InventoryDate, looked up at most once a day"""
+        day = time.strftime("%Y-%m-%d")
+        inventory_date = self._inventory_date_cache.get(day)
+        if inventory_date is None:
+            result = self.db.query(LATEST_INVENTORY_DATE_QUERY)
+            if not result or isinstance(result, str) or result[0][0] is None:
+                return None
+            inventory_date = result[0][0]
+            self._inventory_date_cache.set(day, inventory_date)
+        return inventory_date
+
+    def _bind_inventory_date(self, query: str) -> "tuple[str, tuple]":
+        """Replace the latest-InventoryDate subquery with a bound, cached value.
+
+        Returns the query and its parameters; the query is unchanged (with no
+        parameters) when it has no such subquery or the date can't be read.
+        """
+        matches = len(_LATEST_INVENTORY_DATE_RE.findall(query))
+        if not matches:
+            return query, ()
+
+        inventory_date = self._current_inventory_date()
+        if inventory_date is None:
+            return query, ()
+        return _LATEST_INVENTORY_DATE_RE.sub('?', query), (inventory_date,) * matches
+
+    def _fast_table_count(self, table_name: str) -> Optional[int]:
+        """Read a table's row count from partition metadata instead of scanning it"""
+        for count_query in self._count_queries:
+            result = self.db.query(count_query, (table_name.strip(),))
+            if isinstance(result, str):
+                # Typically a login without VIEW DATABASE STATE; that won't
+                # change for this connection, so stop paying the failed round trip
+                if count_query is _FAST_COUNT_QUERY and len(self._count_queries) > 1:
+                    self._count_queries = (_CATALOG_COUNT_QUERY,)
+                continue
+            if result and result[0][0] is not None:
+                return result[0][0]
+        return None
+
+    @staticmethod
+    def _single_table(query: str, query_upper: str) -> Optional[str]:
+        """The table a single-SELECT, single-table query reads from, else None"""
+        if query_upper.count('SELECT') != 1:
+            return None
+        tables = _table_references(query)
+        return tables[0] if len(tables) == 1 else None
+
+    def _count_table_rows(self, table_name: str, exact: bool = False) -> int:
+        """Return the row count for a table, served from the TTL cache when fresh.
+
+        The count comes from partition metadata when available; exact=True
+        always scans with COUNT_BIG(*).
+        """
+        cache_key = _table_cache_key(table_name) + (" (exact)" if exact else "")
+        row_count = self._count_cache.get(cache_key)
+        if row_count is not None:
+            logger.debug(f"Using cached row count for table '{table_name}'")
+            return row_count
+
+        row_count = None if exact else self._fast_table_count(table_name)
+        if row_count is None:
+            # Views, synonyms or missing catalog permissions: fall back to a scan
+            result = self.db.query(f"SELECT COUNT_BIG(*) FROM {table_name}")
+            if isinstance(result, str):
+                raise RuntimeError(result)
+            if not result:
+                return -1
+            row_count = result[0][0]
 
-    def _estimate_row_count(self, query: str) -> int:
+        self._count_cache.set(cache_key, row_count)
+        return row_count
+
+    def _estimate_row_count(self, query: str, query_upper: Optional[str] = None, params: tuple = ()) -> int:
         """Estimate the number of rows a query will return"""
+        return self._row_count_estimate(query, query_upper, params)[0]
+
+    def _row_count_estimate(self, query: str, query_upper: Optional[str] = None,
+                            params: tuple = ()) -> "tuple[int, str]":
+        """Estimate the rows a query will return, with a qualifier for showing it.
+
+        The qualifier is '' for a counted figure, 'up to ' for a TOP N bound
+        and 'about ' for the optimizer's estimate, to be put in front of the
+        number.
+        """
         try:
-            query_upper = query.strip().upper()
-
-            # Simple heuristic: if it's a basic SELECT * FROM table, get exact count
-            if query_upper.startswith('SELECT *') and 'WHERE' not in query_upper and 'JOIN' not in query_upper:
-                parts = query_upper.split()
-                if len(parts) >= 4 and parts[1] == '*' and parts[2] == 'FROM':
-                    table_name = parts[3].strip()
-                    count_query = f"SELECT COUNT(*) FROM {table_name}"
-                    result = self.db.query(count_query)
-                    if result and not isinstance(result, str):
-                        return result[0][0]
-
-            # For complex queries, strip ORDER BY before wrapping in COUNT
-            count_query = query
-            if 'ORDER BY' in query_upper:
-                # Find ORDER BY position using case-insensitive search
-                order_by_pos = query_upper.rfind('ORDER BY')
-                # Strip from original query (preserving case)
-                count_query = query[:order_by_pos].strip()
-
-            # Wrap in COUNT subquery
-            count_query = f"SELECT COUNT(*) FROM ({count_query}) AS count_subquery"
-            result = self.db.query(count_query)
+            if query_upper is None:
+                query = query.strip()
+                query_upper = query.upper()
+
+            # SELECT TOP N returns at most N rows; report that bound rather
+            # than paying for a COUNT of the source, as fewer rows may match
+            top = _TOP_N_RE.match(query)
+            if top and not top.group(2) and not _SET_OPERATOR_RE.search(query):
+                return int(top.group(1)), 'up to '
+
+            # Single-table queries are answered from table metadata: exactly
+            # when nothing filters or groups rows, and as an upper bound that
+            # settles the question when the whole table fits on screen
+            table_name = self._single_table(query, query_upper)
+            if table_name:
+                row_count = self._count_table_rows(table_name)
+                if row_count >= 0:
+                    if 'WHERE' not in query_upper and not _COUNT_REWRITE_BLOCKERS_RE.search(query):
+                        return row_count, ''
+                    if row_count <= self.max_display_rows:
+                        return row_count, ''
+
+            # Clock-dependent queries are counted afresh, like their results
+            cache_key = None if _VOLATILE_SQL_RE.search(query) else self._result_cache_key(query, params)
+            # Cached with its qualifier, so an estimate is never served as a count
+            cached = self._estimate_cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                return cached
+
+            # The optimizer's estimate costs a compile, not a scan. It is only
+            # trusted when it says the result is too big to show; smaller
+            # estimates may be off, and a COUNT settles those
+            estimate_rows = getattr(self.db, 'estimate_rows', None)
+            row_count = estimate_rows(query, params) if estimate_rows else None
+            if row_count is not None and row_count > self.max_display_rows:
+                if cache_key:
+                    self._estimate_cache.set(cache_key, (row_count, 'about '))
+                return row_count, 'about '
+
+            result = self.db.query(self._build_count_query(query, query_upper), params)
 
             if result and not isinstance(result, str):
-                return result[0][0]
+                if cache_key:
+                    self._estimate_cache.set(cache_key, (result[0][0], ''))
+                return result[0][0], ''
 
         except Exception as e:
             logger.warning(f"Could not estimate row count: {e}")
 
-        return -1  # Unknown
+        return -1, ''  # Unknown
+
+    @staticmethod
+    def _limit_query(query: str, query_upper: str, limit: int) -> str:
+        """Inject TOP (limit) into a plain SELECT; other queries are returned unchanged"""
+        if not query_upper.startswith('SELECT') or _TOP_CLAUSE_RE.match(query):
+            return query
+        # TOP would only bind to the first branch of a set operation, and
+        # can't appear in a query that already pages with OFFSET/FETCH
+        if _SET_OPERATOR_RE.search(query) or _OFFSET_RE.search(query):
+            return query
+        return _SELECT_HEAD_RE.sub(lambda m: f"{m.group(0)}TOP ({limit}) ", query, count=1)
+
+    @staticmethod
+    def _page_query(query: str, query_upper: str) -> Optional[str]:
+        """Append OFFSET ? ROWS FETCH NEXT ? ROWS ONLY to a plain SELECT.
+
+        The query's own ORDER BY is kept; without one the rows are paged in
+        server order. Returns None for queries that can't take an OFFSET
+        clause (TOP, an existing OFFSET, set operations, non-SELECTs) and for
+        SELECT DISTINCT without an ORDER BY, which can't be ordered by
+        (SELECT NULL).
+        """
+        if (not query_upper.startswith('SELECT') or _TOP_CLAUSE_RE.match(query)
+                or _OFFSET_RE.search(query) or _SET_OPERATOR_RE.search(query)):
+            return None
+
+        # A trailing -- comment would swallow the appended paging clause
+        paged = _strip_sql_comments(query).strip().rstrip(';').rstrip()
+        paged_upper = paged.upper()
+        if _outer_order_by_pos(paged_upper) < 0:
+            if _SELECT_DISTINCT_RE.match(paged_upper):
+                return None
+            paged += " ORDER BY (SELECT NULL)"
+        return paged + " OFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _build_count_query(query: str, query_upper: str) -> str:
+        """Build a COUNT query for an arbitrary SELECT, optionally led by CTEs"""
+        count_query = _strip_sql_comments(query).strip().rstrip(';').rstrip()
+        if count_query is not query:
+            # A trailing comment would swallow the wrapper's closing parenthesis
+            query_upper = count_query.upper()
+
+        # The count replaces or wraps the final SELECT; the CTEs stay in front
+        cte_prefix, count_query = _split_cte(count_query, query_upper)
+        query_upper = query_upper[len(cte_prefix):]
+
+        # For complex queries, strip the outer ORDER BY before counting. An
+        # OFFSET ... FETCH after it limits the rows, so that ORDER BY stays
+        # and the query is wrapped below
+        order_by_pos = _outer_order_by_pos(query_upper)
+        if order_by_pos >= 0 and not _OFFSET_RE.search(query_upper, order_by_pos):
+            # query_upper is count_query upper-cased, so positions match
+            count_query = count_query[:order_by_pos].strip()
+
+        # Single SELECT: swap the projection for COUNT_BIG(*) so the server never
+        # evaluates the select list or materializes a derived table. COUNT_BIG
+        # because ebayWT-sized results can overflow COUNT's int.
+        if query_upper.startswith('SELECT') and query_upper.count('SELECT') == 1:
+            select_list = _SELECT_LIST_RE.match(count_query)
+            if (select_list and "'" not in select_list.group(0)
+                    and not _COUNT_REWRITE_BLOCKERS_RE.search(count_query)
+                    and not _AGGREGATE_CALL_RE.search(select_list.group(0))):
+                return cte_prefix + "SELECT COUNT_BIG(*) FROM" + count_query[select_list.end():]
+
+        # Fall back to wrapping in a COUNT subquery. SELECT DISTINCT lands here:
+        # COUNT_BIG(DISTINCT col) would skip the NULL row DISTINCT returns
+        return f"{cte_prefix}SELECT COUNT_BIG(*) FROM ({count_query}) AS count_subquery"
+
+    @staticmethod
+    def _column_names(result: list) -> List[str]:
+        """Column names from the first row's cursor description, or generic names"""
+        if hasattr(result[0], 'cursor_description') and result[0].cursor_description:
+            return [desc[0] for desc in result[0].cursor_description]
+        try:
+            first_row = result[0]
+            column_count = len(first_row)
+            return [f"Column_{i + 1}" for i in range(column_count)]
+        except:
+            return ["Data"]
+
+    def _format_preview(self, rows: Union[list, str], max_cols: int = 8, max_cell_chars: int = 80,
+                        max_chars: int = 4096) -> str:
+        """Render rows as a compact tab-separated table with a header line.
+
+        Long cells are cut to max_cell_chars and rows stop once the text
+        reaches max_chars, so the preview handed to the model stays small
+        however wide the rows are.
+        """
+        if isinstance(rows, str) or not rows:
+            return str(rows)
+
+        column_names = self._column_names(rows)
+        hidden_cols = max(len(column_names) - max_cols, 0)
+
+        def cell(value: Any) -> Any:
+            if isinstance(value, str) and len(value) > max_cell_chars:
+                return value[:max_cell_chars - 3] + '...'
+            return value
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, dialect='excel-tab', lineterminator='\n')
+        writer.writerow(column_names[:max_cols] + ([f"(+{hidden_cols} more columns)"] if hidden_cols else []))
+        for shown, row in enumerate(rows):
+            if buffer.tell() >= max_chars:
+                buffer.write(f"... ({len(rows) - shown:,} more rows not shown)\n")
+                break
+            writer.writerow([cell(value) for value in row[:max_cols]])
+        return buffer.getvalue()
+
+    @staticmethod
+    def _open_export_file(filepath: Path, compress: bool, newline: Optional[str] = None):
+        """Open an export file for writing text, gzip-compressed on the fly if requested.
+
+        Writes go through a 1 MiB buffer, so a large export reaches the disk
+        (or the compressor) in a few big writes instead of many 8 KiB ones.
+        """
+        if compress:
+            # Level 1 keeps CPU low while still giving most of the size saving
+            raw = gzip.GzipFile(filepath, 'wb', compresslevel=1)
+            return io.TextIOWrapper(io.BufferedWriter(raw, buffer_size=EXPORT_BUFFER_SIZE),
+                                    encoding='utf-8', newline=newline)
+        return open(filepath, 'w', buffering=EXPORT_BUFFER_SIZE, newline=newline, encoding='utf-8')
+
+    def _export_via_bcp(self, query: str, filepath: Path, file_format: str) -> Optional[str]:
+        """Export a large result with the bcp utility so rows never pass through Python.
+
+        Only TXT exports qualify: bcp writes fields unquoted, which is the TXT
+        export's raw tab-separated format but would corrupt a CSV whose values
+        contain commas, quotes or newlines. Returns a status message, or None
+        when the bcp path does not apply and the caller should fall back to
+        the regular export.
+        """
+        if file_format.lower() != 'txt':
+            return None
+        # bcp opens its own connection, outside the pool's rollback-on-release
+        # guard, so the query is held to the same rules as the pooled paths
+        rejection = self._check_forbidden(query)
+        if rejection:
+            return rejection
+        # Literals and comments are blanked first, so a ';' inside one doesn't split a statement
+        statements = [statement.strip().upper() for statement in _SQL_LITERAL_OR_COMMENT_RE.sub(' ', query).split(';')
+                      if statement.strip()]
+        if not statements or not all(statement.startswith(('SELECT', 'WITH')) for statement in statements):
+            logger.warning(f"Rejected non-SELECT bcp export: {query}")
+            return "Error: Only SELECT queries are allowed"
+
+        bcp_path = shutil.which('bcp')
+        server_name = getattr(self.db, 'server_name', None)
+        database_name = getattr(self.db, 'database_name', None)
+        # Only trusted connections: SQL logins would put the password on the command line
+        if not bcp_path or not server_name or getattr(self.db, 'username', None):
+            return None
 
-    def _export_to_file(self, query: str, file_format: str = 'csv') -> str:
-        """Export query results to a file"""
+        estimated_rows = self._estimate_row_count(query)
+        if estimated_rows <= self.bcp_export_threshold:
+            return None
+
+        # -c writes character data with bcp's default tab field terminator
+        command = [bcp_path, query, 'queryout', str(filepath), '-c', '-S', server_name, '-T']
+        if database_name:
+            command += ['-d', database_name]
+
+        logger.info(f"Exporting ~{estimated_rows:,} rows with bcp to {filepath.name}")
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            logger.warning(f"bcp export failed, falling back to ODBC export: {completed.stderr or completed.stdout}")
+            return None
+
+        copied = re.search(r'(\d+) rows copied', completed.stdout)
+        row_count = int(copied.group(1)) if copied else estimated_rows
+        return (f"Exported {row_count:,} rows to {file_format.upper()} format (bulk copy, no header row). "
+                f"File: {filepath.name} "
+                f"Ready for download from server.")
+
+    def _export_filename(self, file_format: str) -> str:
+        """A new export file name, unique within the export directory"""
+        # Exports run on worker threads, and several can start within one
+        # second; the pid and a per-process sequence keep their names apart
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        return f"query_export_{timestamp}_{os.getpid()}-{next(self._export_sequence)}.{file_format}"
+
+    @staticmethod
+    def _parquet_schema(first_row: Any, column_names: List[str], columns: list) -> "tuple[pa.Schema, list]":
+        """Arrow schema for an export, typed from the cursor description, and a value converter per column.
+
+        The column's declared type holds for every batch, where values from
+        the first batch can't show it (an all-NULL column, or the widest
+        decimal). Columns of a type not mapped here, or rows without a cursor
+        description, fall back to the type of the first batch's values, with
+        all-NULL columns written as text. The converter is None for values
+        Arrow takes as they are.
+        """
+        description = getattr(first_row, 'cursor_description', None) or ()
+        fields = []
+        converters = []
+        for i, (name, column) in enumerate(zip(column_names, columns)):
+            type_code = description[i][1] if i < len(description) else None
+            if type_code is None:
+                # Arrow can't infer a type for values that need converting
+                value_type = type(next((value for value in column if value is not None), None))
+                if value_type in _ARROW_CONVERTERS:
+                    type_code = value_type
+            converters.append(_ARROW_CONVERTERS.get(type_code))
+            if type_code is decimal.Decimal:
+                column_type = pa.decimal128(description[i][4], description[i][5])
+            elif type_code in _ARROW_TYPES:
+                column_type = _ARROW_TYPES[type_code]
+            else:
+                column_type = pa.array(column).type
+                if pa.types.is_null(column_type):
+                    column_type = pa.string()
+            fields.append((name, column_type))
+        return pa.schema(fields), converters
+
+    def _export_to_parquet(self, query: str) -> str:
+        """Export query results to a snappy-compressed Parquet file, one row group per fetched batch"""
+        if not PARQUET_AVAILABLE:
+            return ("Parquet export is not available on this server (pyarrow is not installed). "
+                    "Use the compressed CSV export for a compact file instead.")
+        filepath = None
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"query_export_{timestamp}.{file_format}"
+            filename = self._export_filename('parquet')
             filepath = self.export_dir / filename
+            query = self._postprocess_sql(query)
+
+            with contextlib.closing(self.db.iter_query(query)) as batches:
+                first_batch = next(batches, None)
+                if not first_batch:
+                    return "Query executed successfully but returned no data to export."
+
+                column_names = self._column_names(first_batch)
+                first_row = first_batch[0]
+                is_row = hasattr(first_row, '__iter__') and not isinstance(first_row, (str, bytes))
+                schema = None
+                converters = None
+                writer = None
+                row_count = 0
+                try:
+                    for batch in itertools.chain([first_batch], batches):
+                        columns = list(zip(*batch)) if is_row else [batch]
+                        if schema is None:
+                            schema, converters = self._parquet_schema(first_row, column_names, columns)
+                            writer = pq.ParquetWriter(str(filepath), schema, compression='snappy')
+                        arrays = [
+                            pa.array(column if convert is None else
+                                     [None if value is None else convert(value) for value in column],
+                                     type=field.type)
+                            for column, field, convert in zip(columns, schema, converters)
+                        ]
+                        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                        row_count += len(batch)
+                finally:
+                    if writer is not None:
+                        writer.close()
+
+            size_kb = filepath.stat().st_size / 1024
+            return (f"Exported {row_count:,} rows to PARQUET format (snappy-compressed, {size_kb:,.1f} KB). "
+                    f"File: {filename} "
+                    f"Ready for download from server.")
 
-            result = self.db.query(query)
-            if isinstance(result, str):
-                return f"Error executing query for export: {result}"
-
-            if not result:
-                return f"Query executed successfully but returned no data to export."
+        except Exception as e:
+            logger.error(f"Parquet export failed: {e}")
+            # Don't leave a truncated file behind for someone to download
+            if filepath is not None:
+                filepath.unlink(missing_ok=True)
+            return f"Export failed: {e}"
 
-            if hasattr(result[0], 'cursor_description') and result[0].cursor_description:
-                column_names = [desc[0] for desc in result[0].cursor_description]
-            else:
-                try:
-                    first_row = result[0]
-                    column_count = len(first_row)
-                    column_names = [f"Column_{i + 1}" for i in range(column_count)]
-                except:
-                    column_names = ["Data"]
-
-            if file_format.lower() == 'csv':
-                with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
-                    writer = csv.writer(csvfile)
-                    writer.writerow(column_names)
-                    for row in result:
-                        if hasattr(row, '__iter__') and not isinstance(row, (str, bytes)):
-                            row_values = [str(cell) if cell is not None else '' for cell in row]
-                        else:
-                            row_values = [str(row) if row is not None else '']
-                        writer.writerow(row_values)
-
-            elif file_format.lower() == 'txt':
-                with open(filepath, 'w', encoding='utf-8') as txtfile:
-                    txtfile.write('\t'.join(column_names) + '\n')
-                    for row in result:
-                        if hasattr(row, '__iter__') and not isinstance(row, (str, bytes)):
-                            row_values = [str(cell) if cell is not None else '' for cell in row]
-                        else:
-                            row_values = [str(row) if row is not None else '']
-                        txtfile.write('\t'.join(row_values) + '\n')
-
-            row_count = len(result)
-            return (f"Exported {row_count:,} rows to {file_format.upper()} format. "
+    def _export_to_file(self, query: str, file_format: str = 'csv', compress: bool = False) -> str:
+        """Export query results to a file"""
+        try:
+            filename = self._export_filename(file_format)
+            if compress:
+                filename += ".gz"
+            filepath = self.export_dir / filename
+            query = self._postprocess_sql(query)
+
+            if self.bcp_export_threshold is not None and not compress:
+                bcp_message = self._export_via_bcp(query, filepath, file_format)
+                if bcp_message:
+                    return bcp_message
+
+            # Stream the result in fetchmany batches so memory stays bounded
+            # by one batch however many rows are exported
+            with contextlib.closing(self.db.iter_query(query)) as batches:
+                first_batch = next(batches, None)
+                if not first_batch:
+                    return f"Query executed successfully but returned no data to export."
+
+                column_names = self._column_names(first_batch)
+                row_count = 0
+                # Rows of one result set share a type, so check it once, not per row
+                first_row = first_batch[0]
+                is_row = hasattr(first_row, '__iter__') and not isinstance(first_row, (str, bytes))
+
+                is_csv = file_format.lower() == 'csv'
+                # TXT keeps platform line endings; csv.writer writes its own
+                with self._open_export_file(filepath, compress, newline='' if is_csv else None) as exportfile:
+                    if is_csv:
+                        writer = csv.writer(exportfile)
+                        writer.writerow(column_names)
+                        write_batch = writer.writerows
+                    else:
+                        # TXT is a plain tab join with no quoting or escaping,
+                        # so values such as 3/4" HOSE are written as they are
+                        exportfile.write('\t'.join(column_names) + '\n')
+
+                        def write_batch(rows):
+                            exportfile.writelines(
+                                '\t'.join(['' if cell is None else str(cell) for cell in row]) + '\n'
+                                for row in rows)
+
+                    for batch in itertools.chain([first_batch], batches):
+                        # One call per batch; for CSV, csv stringifies cells and
+                        # writes None as '' in C, with no per-row Python call
+                        write_batch(batch if is_row else ([row] for row in batch))
+                        row_count += len(batch)
+
+            compression_note = ""
+            if compress:
+                size_kb = filepath.stat().st_size / 1024
+                compression_note = f" (gzip-compressed, {size_kb:,.1f} KB)"
+            return (f"Exported {row_count:,} rows to {file_format.upper()} format{compression_note}. "
                     f"File: {filename} "
                     f"Ready for download from server.")
 
@@ -459,48 +1024,101 @@ class DatabasePlugin:
         name="query",
         description=comprehensive_query_description
     )
-    def query(self, query: Annotated[str, "The SQL query"]) -> Annotated[
-        Union[List[pyodbc.Row], str], "The rows returned or a message"]:
+    async def query(self, query: Annotated[str, "The SQL query"]) -> Annotated[
+        str, "The rows returned as a table, or a message"]:
         logger.info(f"Running database plugin with query: {query}")
-
+        # pyodbc blocks; run on a worker thread so the server's event loop
+        # keeps serving other requests while this one waits on SQL Server
+        return await asyncio.to_thread(self._run_query, query)
+
+    def _run_query(self, query: str) -> str:
+        """Body of the query kernel function; blocks on the database.
+
+        Always returns text: a table of the rows, a summary of an oversized
+        result, or an error or rejection message.
+        """
+        rejection = self._check_forbidden(query)
+        if rejection:
+            return rejection
+
+        query = self._postprocess_sql(query)
+        query, params = self._bind_inventory_date(query)
+        # Stripped and upper-cased once here; the rewrite/estimation helpers
+        # share both, so their strip() calls are no-ops and positions line up
+        query = query.strip()
         query_upper = query.upper()
-        forbidden_patterns = [
-            '_BACKUP', '_TEMP', '_STAGING', '_WORK',
-            'TEMP_', 'BACKUP_', 'OLD_', 'ARCHIVE_',
-            'TEST', 'DEV', 'INTERMEDIATE'
-        ]
-
-        for pattern in forbidden_patterns:
-            if pattern in query_upper:
-                error_msg = f"Query rejected: Contains forbidden table pattern '{pattern}'. Only approved production tables are allowed."
-                logger.warning(error_msg)
-                return error_msg
 
-        estimated_rows = self._estimate_row_count(query)
-
-        # In database_plugin.py query method
+        # Run the query once, asking for one row more than we display, so an
+        # oversized result is detected without transferring all of it. Queries
+        # TOP can't be injected into are capped on the client with a partial fetch.
+        limited_query = self._limit_query(query, query_upper, self.max_display_rows + 1)
+        result = self._cached_query(limited_query, params, max_rows=self.max_display_rows + 1)
+
+        if isinstance(result, str):
+            return result
+        if not result:
+            return "Query executed successfully but returned no rows."
+        if len(result) <= self.max_display_rows:
+            # A table with a header line instead of the list itself, which the
+            # kernel would stringify with a repr() per row and per cell
+            return self._format_preview(result, max_cols=FULL_RESULT_MAX_COLS,
+                                        max_cell_chars=FULL_RESULT_MAX_CELL_CHARS, max_chars=FULL_RESULT_MAX_CHARS)
+
+        # Only oversized results pay for a count, to report the real size
+        estimated_rows, qualifier = self._row_count_estimate(query, query_upper, params)
         if estimated_rows > self.max_display_rows:
-            # Get a small sample automatically
-            sample_query = f"SELECT TOP 5 * FROM ({query}) AS sample_results"
-            sample_results = self.db.query(sample_query)
-
-            return (f"Found {estimated_rows:,} records. Here are the first 5 results:\n\n" +
-                    str(sample_results) +
-                    f"\n\nFull dataset contains {estimated_rows:,} rows. " +
+            # The sample is the head of the rows already fetched, in query order
+            return (f"Found {qualifier}{estimated_rows:,} records. Here are the first 5 results:\n\n" +
+                    self._format_preview(result[:5]) +
+                    f"\n\nFull dataset contains {qualifier}{estimated_rows:,} rows. " +
                     f"Would you like to:\n" +
                     f"1) See more specific results with filters\n" +
-                    f"2) Export all {estimated_rows:,} records to CSV\n" +
+                    f"2) Export the full results ({qualifier}{estimated_rows:,} records) to CSV\n" +
                     f"3) Show me the generated SQL query")
 
-        result = self.db.query(query)
-
-        if isinstance(result, list) and len(result) > self.max_display_rows:
-            return (f"Query returned {len(result):,} rows (showing first {self.max_display_rows}):\n\n" +
-                    str(result[:self.max_display_rows]) +
-                    f"\n\n... and {len(result) - self.max_display_rows:,} more rows. "
-                    f"Ask me to 'export full results to CSV' if you need all data.")
+        return (f"Query returned more than {self.max_display_rows:,} rows (showing first {self.max_display_rows}):\n\n" +
+                self._format_preview(result[:self.max_display_rows]) +
+                f"\n\n... and more rows not shown. "
+                f"Ask me to 'export full results to CSV' if you need all data.")
 
-        return result
+    @kernel_function(
+        name="query_page",
+        description=(
+            "Fetch one page of a large query result, e.g. page 2 for the rows after the first ones shown. "
+            "Pages are numbered from 1 and hold the same number of rows the query function displays."
+        )
+    )
+    async def query_page(self, query: Annotated[str, "The SQL query"],
+                         page: Annotated[int, "The 1-based page number"] = 1) -> Annotated[
+        str, "The rows of the requested page or a message"]:
+        logger.info(f"Fetching page {page} of query: {query}")
+        return await asyncio.to_thread(self._run_query_page, query, page)
+
+    def _run_query_page(self, query: str, page: int) -> str:
+        """Body of the query_page kernel function; blocks on the database"""
+        rejection = self._check_forbidden(query)
+        if rejection:
+            return rejection
+
+        query = self._postprocess_sql(query)
+        query, params = self._bind_inventory_date(query)
+        query = query.strip()
+        paged_query = self._page_query(query, query.upper())
+        if paged_query is None:
+            return ("This query can't be paged (it uses TOP, OFFSET or UNION, or is a SELECT DISTINCT "
+                    "without ORDER BY). "
+                    "Add filters or export the full results to CSV instead.")
+
+        page = max(int(page), 1)
+        skip = (page - 1) * self.max_display_rows
+        result = self._cached_query(paged_query, params + (skip, self.max_display_rows))
+        if isinstance(result, str):
+            return result
+        if not result:
+            return f"Page {page} is empty; the query has {skip:,} rows or fewer."
+
+        return (f"Rows {skip + 1:,}-{skip + len(result):,} (page {page}):\n\n" +
+                self._format_preview(result))
 
     @kernel_function(
         name="suggest_similar_matches",
@@ -509,25 +1127,27 @@ class DatabasePlugin:
             "Helps users discover the correct customer/product names in the database."
         )
     )
-    def suggest_similar_matches(self,
-                                search_term: Annotated[str, "The customer or product name that returned no results"]) -> \
+    async def suggest_similar_matches(self,
+                                      search_term: Annotated[str, "The customer or product name that returned no results"]) -> \
     Annotated[str, "Suggested similar matches"]:
         """Find similar customer or product names when exact search fails"""
         try:
-            customer_query = f"SELECT DISTINCT TOP 10 CustomerName FROM pmsalespbi WHERE UPPER(CustomerName) LIKE '%{search_term.upper()}%' ORDER BY CustomerName"
-            customer_result = self.db.query(customer_query)
+            # The model retries the same misspelling across turns; the
+            # normalized term lets those retries hit the result cache
+            result = await asyncio.to_thread(self._cached_query, _SIMILAR_MATCHES_QUERY, (search_term.strip().upper(),))
 
-            product_query = f"SELECT DISTINCT TOP 10 Product FROM pmsalespbi WHERE UPPER(Product) LIKE '%{search_term.upper()}%' ORDER BY Product"
-            product_result = self.db.query(product_query)
+            customer_names = []
+            product_names = []
+            if result and not isinstance(result, str):
+                for kind, name in result:
+                    (customer_names if kind == 'C' else product_names).append(name)
 
             suggestions = []
 
-            if customer_result and not isinstance(customer_result, str) and len(customer_result) > 0:
-                customer_names = [row[0] for row in customer_result]
+            if customer_names:
                 suggestions.append(f"Similar customer names found: {', '.join(customer_names)}")
 
-            if product_result and not isinstance(product_result, str) and len(product_result) > 0:
-                product_names = [row[0] for row in product_result]
+            if product_names:
                 suggestions.append(f"Similar product names found: {', '.join(product_names)}")
 
             if suggestions:
@@ -540,14 +1160,123 @@ class DatabasePlugin:
             logger.error(f"Error in suggest_similar_matches: {e}")
             return f"Error searching for similar matches: {e}"
 
+    def _oean_360_results(self, oean: str) -> Union["dict[str, list]", str]:
+        """Run all 360-degree OEAN lookups in a single round trip, keyed by section"""
+        results = self.db.query_batch(_OEAN_360_BATCH, (oean,) * len(OEAN_360_QUERIES))
+        if isinstance(results, str):
+            return results
+        return {section: rows for (section, _), rows in zip(OEAN_360_QUERIES, results)}
+
+    @kernel_function(
+        name="oean_360",
+        description=(
+            "Complete 360-degree intelligence for one OEAN in a single call: product mapping, MSRP, "
+            "competition, suppliers, eBay market, our sales performance and performance score."
+        )
+    )
+    async def oean_360(self, oean: Annotated[str, "The OEAN / OE part number"]) -> Annotated[
+        str, "Results for each section"]:
+        logger.info(f"Running 360-degree OEAN analysis for: {oean}")
+        results = await asyncio.to_thread(self._oean_360_results, oean.strip())
+        if isinstance(results, str):
+            return f"Error running OEAN analysis: {results}"
+
+        return "\n\n".join(
+            f"{section}:\n" + (self._format_preview(rows).rstrip() if rows else "(no rows)")
+            for section, rows in results.items()
+        )
+
+    @kernel_function(
+        name="suggest_sql",
+        description=(
+            "Return the documented SQL template for a well-known intent such as 'MSRP by OEAN', "
+            "'Category inventory summary' or 'Pricing gaps'. Replace the example values before running it."
+        )
+    )
+    def suggest_sql(self, intent: Annotated[str, "The intent name of a documented example query"]) -> Annotated[
+        str, "The SQL template or the list of known intents"]:
+        sql = _INTENT_SQL.get(intent.strip().lower())
+        if sql is not None:
+            return sql
+        return f"No template for '{intent}'. Known intents: {', '.join(sorted(_INTENT_SQL))}"
+
+    async def _run_export(self, export: Any, *args: Any, **kwargs: Any) -> str:
+        """Run an export on the export pool, returning its message if it finishes quickly.
+
+        Otherwise the export is left running as a job and the message says how
+        to collect the result, so a multi-million-row export doesn't hold up
+        the conversation.
+        """
+        future = _export_pool.submit(export, *args, **kwargs)
+        # asyncio.wait, unlike wait_for, leaves the export running on timeout
+        done, _ = await asyncio.wait([asyncio.wrap_future(future)], timeout=EXPORT_WAIT_SECONDS)
+        if done:
+            return future.result()
+
+        job_id = uuid.uuid4().hex
+        _export_jobs.set(job_id, future)
+        # Storing the job again when it finishes starts its expiry from then
+        future.add_done_callback(lambda finished: _export_jobs.set(job_id, finished))
+        logger.info(f"Export still running after {EXPORT_WAIT_SECONDS}s, continuing as job {job_id}")
+        return (f"The export is large and is still running as job {job_id}. "
+                f"Use get_export_status with job id {job_id} to get the file once it is ready.")
+
+    @kernel_function(
+        name="get_export_status",
+        description=(
+            "Check on an export that was still running when the export function returned. "
+            "Pass the job id from that message; returns the file name once the export has finished."
+        )
+    )
+    async def get_export_status(self, job_id: Annotated[str, "The export job id"]) -> Annotated[
+        str, "Export status message"]:
+        job_id = job_id.strip()
+        future = _export_jobs.get(job_id)
+        if future is None:
+            return f"No export job '{job_id}' found. Finished jobs are kept for {EXPORT_JOB_TTL_SECONDS // 3600} hours."
+        if not future.done():
+            return f"Export job {job_id} is still running. Check again shortly."
+
+        try:
+            return future.result()
+        except Exception as e:
+            logger.error(f"Export job {job_id} failed: {e}")
+            return f"Export failed: {e}"
+
     @kernel_function(
         name="export_query_to_csv",
         description="Export query results to a CSV file."
     )
-    def export_query_to_csv(self, query: Annotated[str, "The SQL query to export"]) -> Annotated[
+    async def export_query_to_csv(self, query: Annotated[str, "The SQL query to export"]) -> Annotated[
         str, "Export status message"]:
         logger.info(f"Exporting query to CSV: {query}")
-        return self._export_to_file(query, 'csv')
+        # Fetching and writing block; keep them off the server's event loop
+        return await self._run_export(self._export_to_file, query, 'csv', compress=self.compress_exports)
+
+    @kernel_function(
+        name="export_query_to_csv_gz",
+        description=(
+            "Export query results to a gzip-compressed CSV file (.csv.gz). "
+            "Use for large exports or when the user asks for a compressed or zipped file."
+        )
+    )
+    async def export_query_to_csv_gz(self, query: Annotated[str, "The SQL query to export"]) -> Annotated[
+        str, "Export status message"]:
+        logger.info(f"Exporting query to compressed CSV: {query}")
+        return await self._run_export(self._export_to_file, query, 'csv', compress=True)
+
+    @kernel_function(
+        name="export_query_to_parquet",
+        description=(
+            "Export query results to a Parquet file. Best for very large exports (50,000+ rows) or when "
+            "the user will load the data into Python, Power BI or another analytics tool; "
+            "the file is much smaller and faster to write than CSV."
+        )
+    )
+    async def export_query_to_parquet(self, query: Annotated[str, "The SQL query to export"]) -> Annotated[
+        str, "Export status message"]:
+        logger.info(f"Exporting query to Parquet: {query}")
+        return await self._run_export(self._export_to_parquet, query)
 
     @kernel_function(
         name="export_query_to_txt",
@@ -556,43 +1285,38 @@ class DatabasePlugin:
             "Alternative to CSV export for users who prefer text format."
         )
     )
-    def export_query_to_txt(self, query: Annotated[str, "The SQL query to export"]) -> Annotated[
+    async def export_query_to_txt(self, query: Annotated[str, "The SQL query to export"]) -> Annotated[
         str, "Export status message"]:
         logger.info(f"Exporting query to TXT: {query}")
-        return self._export_to_file(query, 'txt')
+        return await self._run_export(self._export_to_file, query, 'txt', compress=self.compress_exports)
 
     @kernel_function(
         name="get_table_size",
         description=(
-            "Get the approximate number of rows in a table to help users understand data size before querying."
+            "Get the approximate number of rows in a table to help users understand data size before querying. "
+            "Only ask for an exact count when the user needs the precise number; it scans the whole table."
         )
     )
-    def get_table_size(self, table_name: Annotated[str, "Name of the table"]) -> Annotated[
-        str, "Table size information"]:
+    async def get_table_size(self, table_name: Annotated[str, "Name of the table"],
+                             exact: Annotated[bool, "Count every row instead of reading table metadata"] = False) -> \
+    Annotated[str, "Table size information"]:
         logger.info(f"Getting size for table: {table_name}")
+        # Only approved tables are counted, and under the name the prompt uses
+        # for them, so no caller-supplied text reaches the count SQL
+        approved_name = APPROVED_TABLES.get(_table_cache_key(table_name))
+        if approved_name is None:
+            return f"Unknown table '{table_name}'. Approved tables: {', '.join(APPROVED_TABLES.values())}"
+        table_name = approved_name
 
         try:
-            count_query = f"SELECT COUNT(*) FROM {table_name}"
-            result = self.db.query(count_query)
+            row_count = await asyncio.to_thread(self._count_table_rows, table_name, exact)
+            approximately = "" if exact else "approximately "
 
-            if isinstance(result, str):
-                return f"Error getting table size: {result}"
-
-            if result:
-                row_count = result[0][0]
-                logger.info(
-                    f"Table '{table_name}' contains {row_count:,} rows. WARNING: Very large - Use specific WHERE conditions or TOP N")
-
-                if row_count > 1000000:
-                    size_context = "VERY LARGE - Use specific WHERE conditions or TOP N"
-                elif row_count > 100000:
-                    size_context = "LARGE - Consider using TOP N for faster queries"
-                elif row_count > 10000:
-                    size_context = "MEDIUM - Good for most queries"
-                else:
-                    size_context = "SMALL - Fast for any query"
-
-                return f"Table '{table_name}' contains {row_count:,} rows. {size_context}"
+            if row_count >= 0:
+                size_context = TABLE_SIZE_LABELS[bisect.bisect_left(TABLE_SIZE_THRESHOLDS, row_count)]
+                logger.info(f"Table '{table_name}' contains {approximately}{row_count:,} rows. {size_context}")
+
+                return f"Table '{table_name}' contains {approximately}{row_count:,} rows. {size_context}"
             else:
                 return f"Table '{table_name}' appears to be empty or doesn't exist."
 
@@ -0,0 +1,101 @@
+# test_database_plugin.py - Tests for the SQL rewrites and exports in DatabasePlugin
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+import uuid
+from unittest.mock import Mock
+
+# Add the parent directory to sys.path to import the plugin module
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.plugins.database_plugin import PARQUET_AVAILABLE, DatabasePlugin
+
+if PARQUET_AVAILABLE:
+    import pyarrow.parquet as pq
+
+
+def build_count_query(query):
+    return DatabasePlugin._build_count_query(query, query.upper())
+
+
+class CountQueryTests(unittest.TestCase):
+    """The COUNT built for a query must return the query's own row count"""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute("CREATE TABLE parts (PartNumber TEXT, ProdGroupDes TEXT)")
+        self.conn.executemany("INSERT INTO parts VALUES (?, ?)", [
+            ('CHR0406R', 'COOLANT HOSES'),
+            ('PFF5225R', 'FILTERS'),
+            ('5760N', None),
+            ('5761N', 'COOLANT HOSES'),
+        ])
+
+    def tearDown(self):
+        self.conn.close()
+
+    def assertCountMatches(self, query):
+        # SQLite has no COUNT_BIG; COUNT counts the same rows
+        count_query = build_count_query(query).replace('COUNT_BIG(', 'COUNT(')
+        expected = len(self.conn.execute(query).fetchall())
+        self.assertEqual(self.conn.execute(count_query).fetchone()[0], expected, count_query)
+
+    def test_distinct_count_includes_null(self):
+        self.assertCountMatches("SELECT DISTINCT ProdGroupDes FROM parts ORDER BY ProdGroupDes")
+
+    def test_plain_select_is_rewritten_to_count(self):
+        query = "SELECT PartNumber, ProdGroupDes FROM parts WHERE ProdGroupDes = 'COOLANT HOSES'"
+        self.assertNotIn('count_subquery', build_count_query(query))
+        self.assertCountMatches(query)
+
+    def test_from_inside_select_list_literal(self):
+        query = "SELECT 'x FROM y' AS a, PartNumber FROM parts"
+        self.assertIn('count_subquery', build_count_query(query))
+        self.assertCountMatches(query)
+
+    def test_outer_offset_fetch_is_kept(self):
+        # SQLite has no OFFSET ... FETCH, so only the rewritten text is checked
+        query = "SELECT PartNumber FROM parts ORDER BY PartNumber OFFSET 10 ROWS FETCH NEXT 5 ROWS ONLY"
+        self.assertEqual(build_count_query(query), f"SELECT COUNT_BIG(*) FROM ({query}) AS count_subquery")
+
+
+class DescribedRow(tuple):
+    """A row carrying a cursor description, as pyodbc rows do"""
+    cursor_description = (
+        ('PartNumber', str, None, 20, 20, 0, True),
+        ('RowGuid', uuid.UUID, None, 16, 16, 0, True),
+    )
+
+
+@unittest.skipUnless(PARQUET_AVAILABLE, "pyarrow is not installed")
+class ParquetExportTests(unittest.TestCase):
+
+    def setUp(self):
+        self.export_dir = tempfile.mkdtemp()
+        self.db = Mock()
+        self.db.query.return_value = []
+        self.plugin = DatabasePlugin(self.db, export_dir=self.export_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.export_dir)
+
+    def test_uniqueidentifier_column_is_written_as_text(self):
+        guid = uuid.uuid4()
+        rows = [DescribedRow(('CHR0406R', guid)), DescribedRow(('PFF5225R', None))]
+        # iter_query is a generator; the export closes it when done
+        self.db.iter_query.side_effect = lambda query: (batch for batch in [rows])
+
+        message = self.plugin._export_to_parquet("SELECT PartNumber, RowGuid FROM parts")
+
+        self.assertTrue(message.startswith("Exported 2 rows"), message)
+        [filename] = os.listdir(self.export_dir)
+        table = pq.read_table(os.path.join(self.export_dir, filename))
+        self.assertEqual(table.column('RowGuid').to_pylist(), [str(guid), None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,6 @@ from unittest.mock import Mock, patch, MagicMock
 import requests
 import json
 import threading
-import time
 import os
 import sys
 from datetime import datetime
@@ -71,14 +70,57 @@ class MockResponse:
         return self.json_data
 
 
+def clear_root(root):
+    """Destroy the widgets a VoiceClientGUI built on root, keeping root itself.
+
+    Pending after() callbacks are cancelled first, as root.destroy() used to
+    do; otherwise the next test's root.update() runs them against the
+    previous app's destroyed widgets.
+    """
+    for after_id in root.tk.splitlist(root.tk.call('after', 'info')):
+        root.after_cancel(after_id)
+    for child in root.winfo_children():
+        child.destroy()
+    root.update_idletasks()
+
+
+def build_app(root):
+    """Create a VoiceClientGUI on root and wait for the threads it starts.
+
+    Construction starts background work such as microphone calibration;
+    joining those threads replaces guessing how long to sleep for them.
+    """
+    started = []
+    real_thread = threading.Thread
+
+    def record_thread(*args, **kwargs):
+        thread = real_thread(*args, **kwargs)
+        started.append(thread)
+        return thread
+
+    with patch('threading.Thread', side_effect=record_thread):
+        app = VoiceClientGUI(root, auto_test_connection=False)
+    for thread in started:
+        thread.join(1.0)
+    root.update()
+    return app
+
+
 class TestVoiceClientGUI(unittest.TestCase):
     """Test cases for the Voice Client GUI"""
 
+    @classmethod
+    def setUpClass(cls):
+        """Create one hidden Tk root for the class; starting Tcl/Tk per test dominates the run"""
+        cls.root = tk.Tk()
+        cls.root.withdraw()  # Hide the window during testing
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.root.destroy()
+
     def setUp(self):
         """Set up test fixtures before each test method"""
-        self.root = tk.Tk()
-        self.root.withdraw()  # Hide the window during testing
-
         # Patch requests to avoid actual network calls
         self.requests_patcher = patch('requests.Session')
         self.mock_session_class = self.requests_patcher.start()
@@ -86,7 +128,7 @@ class TestVoiceClientGUI(unittest.TestCase):
         self.mock_session_class.return_value = self.mock_session
 
         # Create the GUI instance with connection testing disabled
-        self.app = VoiceClientGUI(self.root, auto_test_connection=False)
+        self.app = build_app(self.root)
 
         # Stop any background threads created during initialization
         self._stop_background_threads()
@@ -105,9 +147,6 @@ class TestVoiceClientGUI(unittest.TestCase):
         if hasattr(self.app, 'is_listening'):
             self.app.is_listening = False
 
-        # Give a brief moment for threads to stop
-        time.sleep(0.02)
-
     def tearDown(self):
         """Clean up after each test method"""
         # Stop any ongoing operations
@@ -117,29 +156,9 @@ class TestVoiceClientGUI(unittest.TestCase):
         # Stop background threads
         self._stop_background_threads()
 
-        # Small delay to let threads finish
-        time.sleep(0.02)
-
         # Clean up patches and GUI
         self.requests_patcher.stop()
-        self.root.destroy()
-
-    def test_initialization(self):
-        """Test that the GUI initializes properly"""
-        self.assertIsNotNone(self.app)
-        self.assertEqual(self.app.server_url, "http://BI-SQL001:8000")
-        self.assertIsInstance(self.app.auto_speak_responses, tk.BooleanVar)
-        self.assertIsInstance(self.app.voice_input_enabled, tk.BooleanVar)
-
-    def test_ui_components_exist(self):
-        """Test that all required UI components are created"""
-        # Check that main components exist
-        self.assertTrue(hasattr(self.app, 'input_entry'))
-        self.assertTrue(hasattr(self.app, 'chat_display'))
-        self.assertTrue(hasattr(self.app, 'send_btn'))
-        self.assertTrue(hasattr(self.app, 'voice_btn'))
-        self.assertTrue(hasattr(self.app, 'stop_btn'))
-        self.assertTrue(hasattr(self.app, 'status_label'))
+        clear_root(self.root)
 
     def test_log_message(self):
         """Test the log_message functionality"""
@@ -246,38 +265,6 @@ class TestVoiceClientGUI(unittest.TestCase):
         # Verify export was reset
         self.assertEqual(self.app.export_var.get(), "Display")
 
-    def test_filename_extraction(self):
-        """Test filename extraction from export responses"""
-        test_cases = [
-            ("Exported 100 rows to CSV format. File: query_export_20241201_120000.csv Ready for download",
-             "query_export_20241201_120000.csv"),
-            ("Export completed. The file query_export_20241201_120000.txt is ready",
-             "query_export_20241201_120000.txt"),
-        ]
-
-        for response, expected_filename in test_cases:
-            filename = self.app.extract_filename_from_export_response(response)
-            self.assertEqual(filename, expected_filename)
-
-    def test_is_export_response(self):
-        """Test export response detection"""
-        export_responses = [
-            "Exported 100 rows to CSV format. File: test.csv Ready for download from server.",
-            "Successfully exported data. File: query_export_20241201_120000.txt Ready for download"
-        ]
-
-        non_export_responses = [
-            "Here are your query results:",
-            "No records found matching your criteria",
-            "Database connection error"
-        ]
-
-        for response in export_responses:
-            self.assertTrue(self.app.is_export_response(response))
-
-        for response in non_export_responses:
-            self.assertFalse(self.app.is_export_response(response))
-
     def test_speech_initialization(self):
         """Test speech component initialization"""
         # Since we mocked the speech modules, test that the app handles missing speech gracefully
@@ -318,15 +305,6 @@ class TestVoiceClientGUI(unittest.TestCase):
 
         self.assertGreater(len(content), 0)
 
-    def test_settings_variables(self):
-        """Test settings variables functionality"""
-        # Test boolean variables
-        self.app.auto_speak_responses.set(False)
-        self.assertFalse(self.app.auto_speak_responses.get())
-
-        self.app.voice_input_enabled.set(True)
-        self.assertTrue(self.app.voice_input_enabled.get())
-
     def test_simulated_voice_workflow(self):
         """Test simulated voice input workflow"""
         # Test the voice input handling method directly
@@ -364,17 +342,6 @@ class TestVoiceClientGUI(unittest.TestCase):
         # TTS should handle None gracefully (it checks if tts_engine exists)
         self.assertTrue(tts_graceful, "TTS should fail gracefully when engine is None")
 
-    def test_voice_status_updates(self):
-        """Test voice status indicator updates"""
-        # Test that voice status can be updated without crashing
-        try:
-            self.app.voice_status.config(text="Testing voice status")
-            status_update_works = True
-        except:
-            status_update_works = False
-
-        self.assertTrue(status_update_works, "Voice status updates should work")
-
     def test_text_and_voice_mode_switching(self):
         """Test switching between text and voice modes"""
         # Test text mode
@@ -399,32 +366,143 @@ class TestVoiceClientGUI(unittest.TestCase):
         self.assertIn("First sentence", sentences[0])
 
 
+class SharedAppTests(unittest.TestCase):
+    """Read-only checks that share one VoiceClientGUI instead of rebuilding the widget tree per test"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.root = tk.Tk()
+        cls.root.withdraw()
+
+        cls.requests_patcher = patch('requests.Session')
+        cls.mock_session_class = cls.requests_patcher.start()
+        cls.mock_session = Mock()
+        cls.mock_session_class.return_value = cls.mock_session
+
+        cls.app = build_app(cls.root)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app.stop_all_speech()
+        cls.requests_patcher.stop()
+        cls.root.destroy()
+
+    def setUp(self):
+        self._reset_app()
+
+    def _reset_app(self):
+        """Put back the state a test may have changed on the shared app"""
+        app = self.app
+        app.input_entry.delete(0, tk.END)
+        app.chat_display.config(state=tk.NORMAL)
+        app.chat_display.delete('1.0', tk.END)
+        app.chat_display.config(state=tk.DISABLED)
+        app.export_var.set("Display")
+        app.auto_speak_responses.set(app.speech_capable)
+        app.voice_input_enabled.set(app.speech_capable)
+        app.is_speaking = False
+        app.is_listening = False
+        app.stop_speech_requested = False
+        self.mock_session.reset_mock()
+
+    def test_initialization(self):
+        """Test that the GUI initializes properly"""
+        self.assertIsNotNone(self.app)
+        self.assertEqual(self.app.server_url, "http://BI-SQL001:8000")
+        self.assertIsInstance(self.app.auto_speak_responses, tk.BooleanVar)
+        self.assertIsInstance(self.app.voice_input_enabled, tk.BooleanVar)
+
+    def test_ui_components_exist(self):
+        """Test that all required UI components are created"""
+        # Check that main components exist
+        self.assertTrue(hasattr(self.app, 'input_entry'))
+        self.assertTrue(hasattr(self.app, 'chat_display'))
+        self.assertTrue(hasattr(self.app, 'send_btn'))
+        self.assertTrue(hasattr(self.app, 'voice_btn'))
+        self.assertTrue(hasattr(self.app, 'stop_btn'))
+        self.assertTrue(hasattr(self.app, 'status_label'))
+
+    def test_filename_extraction(self):
+        """Test filename extraction from export responses"""
+        test_cases = [
+            ("Exported 100 rows to CSV format. File: query_export_20241201_120000.csv Ready for download",
+             "query_export_20241201_120000.csv"),
+            ("Export completed. The file query_export_20241201_120000.txt is ready",
+             "query_export_20241201_120000.txt"),
+        ]
+
+        for response, expected_filename in test_cases:
+            filename = self.app.extract_filename_from_export_response(response)
+            self.assertEqual(filename, expected_filename)
+
+    def test_is_export_response(self):
+        """Test export response detection"""
+        export_responses = [
+            "Exported 100 rows to CSV format. File: test.csv Ready for download from server.",
+            "Successfully exported data. File: query_export_20241201_120000.txt Ready for download"
+        ]
+
+        non_export_responses = [
+            "Here are your query results:",
+            "No records found matching your criteria",
+            "Database connection error"
+        ]
+
+        for response in export_responses:
+            self.assertTrue(self.app.is_export_response(response))
+
+        for response in non_export_responses:
+            self.assertFalse(self.app.is_export_response(response))
+
+    def test_settings_variables(self):
+        """Test settings variables functionality"""
+        # Test boolean variables
+        self.app.auto_speak_responses.set(False)
+        self.assertFalse(self.app.auto_speak_responses.get())
+
+        self.app.voice_input_enabled.set(True)
+        self.assertTrue(self.app.voice_input_enabled.get())
+
+    def test_voice_status_updates(self):
+        """Test voice status indicator updates"""
+        # Test that voice status can be updated without crashing
+        try:
+            self.app.voice_status.config(text="Testing voice status")
+            status_update_works = True
+        except:
+            status_update_works = False
+
+        self.assertTrue(status_update_works, "Voice status updates should work")
+
+
 class IntegrationTests(unittest.TestCase):
     """Integration tests that test multiple components working together"""
 
+    @classmethod
+    def setUpClass(cls):
+        cls.root = tk.Tk()
+        cls.root.withdraw()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.root.destroy()
+
     def setUp(self):
         """Set up integration test environment"""
-        self.root = tk.Tk()
-        self.root.withdraw()
-
         # Mock requests completely for integration tests
         self.requests_patcher = patch('requests.Session')
         self.mock_session_class = self.requests_patcher.start()
         self.mock_session = Mock()
         self.mock_session_class.return_value = self.mock_session
 
-        self.app = VoiceClientGUI(self.root, auto_test_connection=False)
-
-        # Stop background threads
-        time.sleep(0.02)
+        self.app = build_app(self.root)
 
     def tearDown(self):
         """Clean up integration test environment"""
         self.app.stop_all_speech()
         self.app.is_listening = False
-        time.sleep(0.02)
         self.requests_patcher.stop()
-        self.root.destroy()
+        clear_root(self.root)
 
     def test_full_query_workflow(self):
         """Test a complete query workflow"""
@@ -552,31 +630,30 @@ class LiveIntegrationTests(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         """Set up mock server for live testing"""
+        # HTTPServer is listening once constructed; no need to wait for serve_forever
         cls.server = create_mock_server()
-        if cls.server:
-            time.sleep(0.2)  # Give server time to start
+        cls.root = tk.Tk()
+        cls.root.withdraw()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.root.destroy()
 
     def setUp(self):
         """Set up live test environment"""
         if not self.server:
             self.skipTest("Mock server could not be started")
 
-        self.root = tk.Tk()
-        self.root.withdraw()
-
         # Create app pointing to mock server
         with patch.dict('os.environ', {'VOICE_SQL_SERVER': 'http://localhost:8001'}):
-            self.app = VoiceClientGUI(self.root, auto_test_connection=False)
-
-        time.sleep(0.05)
+            self.app = build_app(self.root)
 
     def tearDown(self):
         """Clean up live test environment"""
         if hasattr(self, 'app'):
             self.app.stop_all_speech()
             self.app.is_listening = False
-        time.sleep(0.05)
-        self.root.destroy()
+        clear_root(self.root)
 
     def test_live_connection(self):
         """Test connection to mock server"""
@@ -711,7 +788,11 @@ if __name__ == '__main__':
         sys.exit(0 if result.wasSuccessful() else 1)
     elif args.unit:
         # Run unit tests only
-        suite = unittest.TestLoader().loadTestsFromTestCase(TestVoiceClientGUI)
+        loader = unittest.TestLoader()
+        suite = unittest.TestSuite([
+            loader.loadTestsFromTestCase(TestVoiceClientGUI),
+            loader.loadTestsFromTestCase(SharedAppTests)
+        ])
         runner = unittest.TextTestRunner(verbosity=2)
         result = runner.run(suite)
         sys.exit(0 if result.wasSuccessful() else 1)
@@ -720,6 +801,7 @@ if __name__ == '__main__':
         loader = unittest.TestLoader()
         suite = unittest.TestSuite([
             loader.loadTestsFromTestCase(TestVoiceClientGUI),
+            loader.loadTestsFromTestCase(SharedAppTests),
             loader.loadTestsFromTestCase(IntegrationTests),
             loader.loadTestsFromTestCase(LiveIntegrationTests)
         ])
@@ -741,6 +823,7 @@ if __name__ == '__main__':
         loader = unittest.TestLoader()
         suite = unittest.TestSuite([
             loader.loadTestsFromTestCase(TestVoiceClientGUI),
+            loader.loadTestsFromTestCase(SharedAppTests),
             loader.loadTestsFromTestCase(IntegrationTests)
         ])
         runner = unittest.TextTestRunner(verbosity=2)
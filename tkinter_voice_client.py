@@ -707,7 +707,7 @@ class VoiceClientGUI:
         export_indicators = [
             "Exported" in response and "rows to" in response,
             "File:" in response and "Ready for download" in response,
-            "query_export_" in response and (".csv" in response or ".txt" in response)
+            "query_export_" in response and (".csv" in response or ".txt" in response or ".parquet" in response)
         ]
         return any(export_indicators)
 
@@ -737,7 +737,7 @@ class VoiceClientGUI:
                 return parts.strip()
 
             # Method 2: Look for query_export pattern
-            pattern = r'query_export_\d{8}_\d{6}\.(csv|txt)'
+            pattern = r'query_export_\d{8}_\d{6}(_\d+-\d+)?\.(csv|txt|parquet)(\.gz)?'
             match = re.search(pattern, response)
             if match:
                 return match.group(0)
@@ -772,7 +772,13 @@ class VoiceClientGUI:
         try:
             # Determine file type for dialog
             file_extension = os.path.splitext(filename)[1].lower()
-            if file_extension == '.csv':
+            if file_extension == '.gz':
+                file_types = [("Gzip files", "*.gz"), ("All files", "*.*")]
+                default_name = filename.replace('.csv.gz', '_data.csv.gz').replace('.txt.gz', '_data.txt.gz')
+            elif file_extension == '.parquet':
+                file_types = [("Parquet files", "*.parquet"), ("All files", "*.*")]
+                default_name = filename.replace('.parquet', '_data.parquet')
+            elif file_extension == '.csv':
                 file_types = [("CSV files", "*.csv"), ("All files", "*.*")]
                 default_name = filename.replace('.csv', '_data.csv')
             else: